@@ -0,0 +1,159 @@
+"""Read-only analytics over a periodically refreshed local SQLite copy of the store tables.
+
+Ad-hoc queries from the SQL editor run here instead of against Supabase, so a
+heavy report can never slow down the tills.
+"""
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from bulk_io import iter_table
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TABLES = ('products', 'sales', 'expenses', 'returns', 'purchase_orders')
+SNAPSHOT_INDEXES = {
+    'sales': ('created_at', 'product_id', 'order_id'),
+    'expenses': ('expense_date', 'category'),
+    'returns': ('created_at', 'product_id'),
+    'purchase_orders': ('created_at', 'product_id', 'supplier_id'),
+    'products': ('category',),
+}
+
+# Statement kinds a read-only query may use; everything else is refused by the authorizer
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+
+class QueryError(Exception):
+    pass
+
+
+def _cell(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class AnalyticsSnapshot:
+    def __init__(self, client, path=None, refresh_seconds=900, timeout_seconds=5.0, row_cap=10000,
+                 tables=SNAPSHOT_TABLES):
+        self.client = client
+        self.path = path or os.path.join(tempfile.gettempdir(), 'grocery-analytics.sqlite3')
+        self.refresh_seconds = refresh_seconds
+        self.timeout_seconds = timeout_seconds
+        self.row_cap = row_cap
+        self.tables = tables
+        self.refresh_lock = threading.Lock()
+
+    # -- snapshot maintenance
+    def refreshed_at(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def refresh(self):
+        """Copy the source tables into a new database file and swap it in atomically."""
+        with self.refresh_lock:
+            fd, tmp_path = tempfile.mkstemp(suffix='.sqlite3', dir=os.path.dirname(self.path) or '.')
+            os.close(fd)
+            try:
+                conn = sqlite3.connect(tmp_path)
+                with conn:
+                    for table in self.tables:
+                        self._copy_table(conn, table)
+                conn.close()
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+        logger.info('Analytics snapshot refreshed at %s', self.path)
+
+    def _copy_table(self, conn, table):
+        rows = iter_table(self.client, table, ['*'])
+        first = next(rows, None)
+        if first is None:
+            conn.execute(f'CREATE TABLE "{table}" (id INTEGER PRIMARY KEY)')
+            return
+        columns = list(first)
+        column_sql = ', '.join(f'"{c}"' + (' PRIMARY KEY' if c == 'id' else '') for c in columns)
+        conn.execute(f'CREATE TABLE "{table}" ({column_sql})')
+        insert = f'INSERT INTO "{table}" VALUES ({", ".join("?" for _ in columns)})'
+        batch = [first]
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= 1000:
+                conn.executemany(insert, [[_cell(r.get(c)) for c in columns] for r in batch])
+                batch = []
+        conn.executemany(insert, [[_cell(r.get(c)) for c in columns] for r in batch])
+        for column in SNAPSHOT_INDEXES.get(table, ()):
+            if column in columns:
+                conn.execute(f'CREATE INDEX "{table}_{column}_idx" ON "{table}" ("{column}")')
+
+    def ensure_fresh(self):
+        refreshed = self.refreshed_at()
+        if refreshed is None:
+            self.refresh()
+        elif time.time() - refreshed > self.refresh_seconds and not self.refresh_lock.locked():
+            # Serve the current copy while a new one is built in the background
+            threading.Thread(target=self._refresh_quietly, daemon=True).start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception('Analytics snapshot refresh failed')
+
+    # -- querying
+    def _connect(self):
+        conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+        conn.execute('PRAGMA query_only = ON')
+        conn.set_authorizer(lambda action, *args: sqlite3.SQLITE_OK if action in _ALLOWED_ACTIONS
+                            else sqlite3.SQLITE_DENY)
+        deadline = time.monotonic() + self.timeout_seconds
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+        return conn
+
+    def _prepare(self, sql):
+        sql = (sql or '').strip().rstrip(';').strip()
+        if not sql:
+            raise QueryError('Enter a query')
+        if not sql.split(None, 1)[0].lower() in ('select', 'with'):
+            raise QueryError('Only read-only SELECT queries are allowed')
+        return sql
+
+    def iter_rows(self, sql, offset=0, limit=None):
+        """Yield (columns, row) pairs for one window of a SELECT, capped at row_cap."""
+        sql = self._prepare(sql)
+        limit = min(limit or self.row_cap, self.row_cap - offset)
+        if limit <= 0:
+            return
+        self.ensure_fresh()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(f'SELECT * FROM ({sql}) LIMIT ? OFFSET ?', (limit, offset))
+            columns = [d[0] for d in cursor.description]
+            while True:
+                chunk = cursor.fetchmany(500)
+                if not chunk:
+                    return
+                for row in chunk:
+                    yield columns, row
+        except sqlite3.DatabaseError as e:
+            message = 'Query exceeded the time limit' if 'interrupted' in str(e) else str(e)
+            raise QueryError(message) from e
+        finally:
+            conn.close()
+
+    def page(self, sql, page=1, page_size=100):
+        """Return (rows as dicts, has_more) for a 1-based page."""
+        page, page_size = max(int(page), 1), max(1, min(int(page_size), self.row_cap))
+        offset = (page - 1) * page_size
+        rows = [dict(zip(columns, row)) for columns, row in self.iter_rows(sql, offset, page_size + 1)]
+        return rows[:page_size], len(rows) > page_size
@@ -1,21 +1,101 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user
-from supabase import create_client, Client
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, Response, stream_with_context, g, has_request_context
+from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from dotenv import load_dotenv
+from werkzeug.exceptions import BadRequest
+from analytics import AnalyticsSnapshot, QueryError
+from cachetools import LRUCache, TTLCache
+import bulk_io
+import click
+from dashboard_summary import DashboardSummary
+from discount_index import DiscountError, DiscountIndex
+from events import EventBroker, RealtimeFanout
+from http_cache import (AssetFingerprints, Compressor, TableVersions, cache_static, conditional, mark_degraded,
+                        template_stamp, written_tables)
+from metrics import InstrumentedClient, current_queries, registry, request_latency
+from query_batch import QueryBatch
+from reference_cache import ReferenceCache
+from reorder import ReorderPlanner
+from reports import SalesReports
+from search_index import SearchIndex
+from supabase_client import LazyClient, check_config, create_supabase
+import hashlib
+import json
 import os
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'super-secret-key-change-this-in-production-2026')
 
-supabase_url = os.getenv('SUPABASE_URL')
-supabase_key = os.getenv('SUPABASE_KEY')
-if not supabase_url or not supabase_key:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
-
-supabase: Client = create_client(supabase_url, supabase_key)
+# Built on first use (see supabase_client.py), so each server worker gets its own connection pool
+check_config()
+raw_supabase = LazyClient(create_supabase)
+supabase = InstrumentedClient(raw_supabase)
+
+# Requests slower than this are logged with their per-query breakdown; 0 disables the log
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 0))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.query_token = current_queries.set([])
+
+
+@app.after_request
+def record_request_timing(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    request_latency.observe(elapsed, request.endpoint or 'unmatched', request.method, response.status_code)
+    breakdown = current_queries.get() or []
+    current_queries.reset(g.pop('query_token'))
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        queries_ms = ', '.join(f'{table}.{op}={secs * 1000:.1f}ms' for table, op, secs in breakdown)
+        app.logger.warning('Slow request %s %s took %.1fms (%d queries: %s)', request.method, request.path,
+                           elapsed * 1000, len(breakdown), queries_ms or 'none')
+    return response
+
+
+# HTTP caching: pages revalidate against per-table change counters (see supabase/migrations/*_cache_versions.sql),
+# text responses are compressed, and static files linked with asset_url() are fingerprinted and cached for a year
+table_versions = TableVersions(supabase, check_seconds=float(os.getenv('HTTP_VERSION_CHECK_SECONDS', 2)))
+TEMPLATE_STAMP = template_stamp(os.path.join(app.root_path, 'templates'))
+assets = AssetFingerprints(app.static_folder)
+app.jinja_env.globals['asset_url'] = assets.url
+compressor = Compressor()
+# Tables changed by the SQL functions, which the per-query breakdown only sees as rpc:<name>
+RPC_WRITES = {
+    'checkout_cart': ('sales', 'products'),
+    'bulk_adjust_stock': ('products',),
+    'transition_purchase_order': ('purchase_orders', 'products'),
+    'transition_return': ('returns', 'products'),
+}
+
+
+def cached_page(tables):
+    # Read the stamps before the page's rows: a write racing the render only makes the next ETag differ
+    return conditional(table_versions, tables, build=TEMPLATE_STAMP)
+
+
+@app.after_request
+def finish_response(response):
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        # One bump for every table written, plus the reference tables patched, after the writes committed
+        bumped = reference.flush(written_tables(current_queries.get() or [], RPC_WRITES))
+        summary.writes_stamped(bumped)
+        table_versions.expire()
+    return compressor(cache_static(response))
+
+# Shared pool for running a view's independent reads concurrently
+queries = QueryBatch(max_workers=int(os.getenv('QUERY_POOL_SIZE', 8)),
+                     timeout=float(os.getenv('QUERY_TIMEOUT', 10)),
+                     on_fallback=lambda name: mark_degraded())
 
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
@@ -26,17 +106,169 @@ class User(UserMixin):
         self.email = email
         self.role = role
 
+# Process-local role cache so authenticated requests don't pay a Supabase round trip
+ROLE_CACHE_TTL = int(os.getenv('ROLE_CACHE_TTL', 300))
+ROLE_CACHE_SIZE = int(os.getenv('ROLE_CACHE_SIZE', 1024))
+role_cache = TTLCache(maxsize=ROLE_CACHE_SIZE, ttl=ROLE_CACHE_TTL)
+role_cache_lock = threading.Lock()
+role_cache_stats = {'hits': 0, 'misses': 0, 'session_hits': 0}
+
+
+def cache_role(user_id, role):
+    with role_cache_lock:
+        role_cache[str(user_id)] = role
+    # Flask sessions are signed with app.secret_key, so the claim can't be forged client-side
+    session['role_claim'] = {'uid': str(user_id), 'role': role, 'exp': time.time() + ROLE_CACHE_TTL}
+
+
+def evict_role(user_id):
+    with role_cache_lock:
+        role_cache.pop(str(user_id), None)
+    session.pop('role_claim', None)
+
+
+def get_cached_role(user_id):
+    user_id = str(user_id)
+    claim = session.get('role_claim')
+    with role_cache_lock:
+        if claim and claim.get('uid') == user_id and claim.get('exp', 0) > time.time():
+            role_cache_stats['session_hits'] += 1
+            return claim['role']
+        role = role_cache.get(user_id)
+        role_cache_stats['hits' if role is not None else 'misses'] += 1
+    return role
+
+
 @login_manager.user_loader
 def load_user(user_id):
+    role = get_cached_role(user_id)
+    if role is not None:
+        return User(user_id, "loaded-from-supabase", role)
     try:
         role_data = supabase.table('users').select('role').eq('id', user_id).single().execute().data
         role = role_data.get('role', 'user') if role_data else 'user'
+        cache_role(user_id, role)
         return User(user_id, "loaded-from-supabase", role)
     except:
         return None
 
 CATEGORIES = ["Fruits", "Vegetables", "Dairy", "Snacks", "Grains", "Beverages"]
 
+# Keyset pagination: list pages fetch one page ordered by (order column, id) and hand back
+# a cursor for the next one, so latency stays flat however much history the table holds.
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
+MAX_PAGE_SIZE = 500
+
+LIST_VIEWS = {
+    'sales':           {'table': 'sales', 'order': ('created_at', True),
+                        'filters': ('product_id', 'customer_id'),
+                        'scopes': {'today': {'where': lambda q: q.gte('created_at', datetime.now().strftime('%Y-%m-%d'))}}},
+    'inventory':       {'table': 'products', 'order': ('name', False), 'search': ('name', 'category'),
+                        'filters': ('category',),
+                        'scopes': {'low-stock': {'where': lambda q: q.lte('stock', 10), 'order': ('stock', False)}}},
+    'customers':       {'table': 'customers', 'order': ('created_at', True), 'search': ('name', 'phone', 'email', 'address')},
+    'suppliers':       {'table': 'suppliers', 'order': ('created_at', True), 'search': ('name', 'phone', 'email', 'product_type')},
+    'discounts':       {'table': 'discounts', 'order': ('created_at', True), 'search': ('code', 'description'),
+                        'filters': ('discount_type', 'is_active')},
+    'purchase_orders': {'table': 'purchase_orders', 'order': ('created_at', True),
+                        'filters': ('status', 'product_id', 'supplier_id')},
+    'returns':         {'table': 'returns', 'order': ('created_at', True), 'search': ('reason',),
+                        'filters': ('status', 'product_id', 'sale_id')},
+    'expenses':        {'table': 'expenses', 'order': ('expense_date', True), 'search': ('title', 'note'),
+                        'filters': ('category',)},
+}
+
+
+def _filter_value(value):
+    # PostgREST or=() filters are comma separated; quote values so names with commas/parens survive
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class BadCursor(BadRequest):
+    """A list cursor that list_page didn't hand out."""
+    description = 'Malformed cursor'
+
+
+def parse_cursor(cursor):
+    """(order value, last id) from a cursor; the value is None for rows whose order column is null."""
+    value, sep, last_id = cursor.rpartition('|')
+    try:
+        return (value if sep else None), int(last_id)
+    except ValueError:
+        raise BadCursor() from None
+
+
+def make_cursor(row, order_col):
+    # Rows with no order value get an id-only cursor, never 'None|<id>', which Postgres can't compare
+    value = row.get(order_col)
+    return str(row['id']) if value is None else f"{value}|{row['id']}"
+
+
+def page_loader(name, columns='*', args=None):
+    """Check a LIST_VIEWS request now and return a callable fetching (rows, next_cursor), e.g. for queries.run."""
+    spec = LIST_VIEWS[name]
+    args = request.args if args is None else args
+    try:
+        limit = min(max(int(args.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        limit = PAGE_SIZE
+    scope = spec.get('scopes', {}).get(args.get('filter', ''), {})
+    order_col, desc = scope.get('order', spec['order'])
+
+    query = supabase.table(spec['table']).select(columns)
+    if scope.get('where'):
+        query = scope['where'](query)
+    term = args.get('q', '').strip()
+    if term and spec.get('search'):
+        pattern = _filter_value(f'*{term}*')
+        query = query.or_(','.join(f'{col}.ilike.{pattern}' for col in spec['search']))
+    for col in spec.get('filters', ()):
+        if args.get(col):
+            query = query.eq(col, args[col])
+
+    cursor = args.get('cursor')
+    if cursor:
+        value, last_id = parse_cursor(cursor)
+        op = 'lt' if desc else 'gt'
+        # Postgres sorts nulls last ascending and first descending, so they follow a cursor only when ascending
+        if value is None:
+            after = [f'and({order_col}.is.null,id.{op}.{last_id})'] + ([f'{order_col}.not.is.null'] if desc else [])
+        else:
+            value = _filter_value(value)
+            after = ([f'{order_col}.{op}.{value}', f'and({order_col}.eq.{value},id.{op}.{last_id})']
+                     + ([] if desc else [f'{order_col}.is.null']))
+        query = query.or_(','.join(after))
+    query = query.order(order_col, desc=desc).order('id', desc=desc).limit(limit + 1)
+
+    def fetch():
+        rows = query.execute().data or []
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = make_cursor(rows[-1], order_col)
+        return rows, next_cursor
+    return fetch
+
+
+def list_page(name, columns='*', args=None):
+    """Return (rows, next_cursor) for one keyset page of a LIST_VIEWS entry."""
+    return page_loader(name, columns, args)()
+
+
+@app.route('/api/<name>/page')
+@login_required
+@cached_page(lambda name: (LIST_VIEWS[name]['table'],) if name in LIST_VIEWS else ())
+def list_page_api(name):
+    if name not in LIST_VIEWS:
+        return jsonify({'success': False, 'error': f'Unknown list: {name}'}), 404
+    try:
+        rows, next_cursor = list_page(name)
+        return jsonify({'success': True, 'rows': rows, 'next_cursor': next_cursor})
+    except BadCursor as e:
+        return jsonify({'success': False, 'error': e.description}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -54,6 +286,7 @@ def login():
                     return redirect(url_for('login'))
                 user = User(user_id, email, role)
                 login_user(user, remember=True)
+                cache_role(user_id, role)
                 return redirect(url_for('dashboard'))
         except Exception as e:
             flash(f'Login failed: {str(e)}', 'danger')
@@ -64,64 +297,229 @@ def login():
 @login_required
 def logout():
     supabase.auth.sign_out()
+    evict_role(current_user.get_id())
     logout_user()
     session.clear()
     return redirect(url_for('login'))
 
 
+@registry.collector
+def role_cache_metrics():
+    lines = ['# HELP role_cache_lookups_total Role lookups by outcome.', '# TYPE role_cache_lookups_total counter']
+    with role_cache_lock:
+        stats = dict(role_cache_stats)
+    lines += [f'role_cache_lookups_total{{outcome="{k}"}} {v}' for k, v in stats.items()]
+    return lines
+
+
+@app.route('/metrics')
+def metrics_view():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/role-cache/stats')
+@login_required
+def role_cache_stats_view():
+    with role_cache_lock:
+        stats = {**role_cache_stats, 'size': len(role_cache)}
+    return jsonify({**stats, 'ttl': ROLE_CACHE_TTL})
+
+
+summary = DashboardSummary(reconcile_seconds=int(os.getenv('DASHBOARD_RECONCILE_SECONDS', 300)))
+
+# id -> row maps for pickers and name lookups; patched by the mutation routes below
+reference = ReferenceCache(supabase, {
+    'products': 'id, name, price, stock, category, unit',
+    'suppliers': 'id, name',
+    'customers': 'id, name, phone, email',
+    'discounts': 'id, code, discount_type, discount_value, min_order_value, expires_at, is_active',
+}, refresh_seconds=int(os.getenv('REFERENCE_REFRESH_SECONDS', 300)),
+   version_check_seconds=int(os.getenv('REFERENCE_VERSION_CHECK_SECONDS', 5)))
+discount_codes = DiscountIndex(reference)
+
+
+# Typeahead for the sales counter, maintained row by row from the reference cache
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+search_indexes = {
+    'products': SearchIndex(('name', 'category')),
+    'customers': SearchIndex(('name', 'phone', 'email')),
+}
+for _table, _index in search_indexes.items():
+    reference.subscribe(_table, _index.on_reference_change)
+
+
+# Live deltas for open dashboard/inventory/sales pages, streamed from /events and relayed between
+# server workers over Supabase Realtime (EVENTS_FANOUT=none keeps them in-process, as the memory backend does)
+def event_fanout():
+    if os.getenv('SUPABASE_BACKEND') == 'memory' or os.getenv('EVENTS_FANOUT', 'realtime') == 'none':
+        return None
+    return RealtimeFanout(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'),
+                          topic=os.getenv('EVENTS_TOPIC', 'live-updates'))
+
+
+events = EventBroker(heartbeat_seconds=float(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15)), fanout=event_fanout())
+# Each stream holds a server thread; past this many, pages are told to reconnect later (see serve.py)
+MAX_EVENT_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS', int(os.getenv('WEB_THREADS', 64)) * 3 // 4))
+EVENTS_BUSY_RETRY_MS = 30000
+
+
+def summary_changed():
+    # Coalesced: one dashboard update per request however many products it touched
+    if has_request_context():
+        g.summary_changed = True
+    else:
+        publish_summary()
+
+
+def publish_summary():
+    versions = summary_versions()
+    if summary.needs_reconcile(versions):
+        reconcile_summary(versions)
+    events.publish('summary', summary.snapshot())
+
+
+@app.after_request
+def publish_pending_summary(response):
+    if g.pop('summary_changed', False) and response.status_code < 400:
+        try:
+            publish_summary()
+        except Exception:
+            app.logger.exception('Could not publish the dashboard summary')
+    return response
+
+
+@app.route('/events')
+@login_required
+def event_stream():
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_id', type=int)
+    if events.subscriber_count() >= MAX_EVENT_STREAMS:
+        # EventSource gives up on an error status, but reconnects after a stream that just ends
+        return Response(f'retry: {EVENTS_BUSY_RETRY_MS}\n\n', mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+    return Response(stream_with_context(events.subscribe(last_id)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@registry.collector
+def event_metrics():
+    return ['# HELP live_event_subscribers Open /events streams in this worker.',
+            '# TYPE live_event_subscribers gauge',
+            f'live_event_subscribers {events.subscriber_count()}',
+            '# HELP live_events_published_total Live update events published.',
+            '# TYPE live_events_published_total counter',
+            f'live_events_published_total {events.published}',
+            '# HELP live_events_received_total Live update events relayed from other workers.',
+            '# TYPE live_events_received_total counter',
+            f'live_events_received_total {events.received}',
+            '# HELP live_event_subscribers_dropped_total Streams dropped for falling behind.',
+            '# TYPE live_event_subscribers_dropped_total counter',
+            f'live_event_subscribers_dropped_total {events.dropped}']
+
+
+def product_saved(row):
+    summary.product_added(row)
+    reference.upsert('products', row)
+    summary_changed()
+
+
+def product_deleted(product_id):
+    summary.product_removed(product_id)
+    reference.remove('products', product_id)
+    events.publish('product_deleted', {'id': int(product_id)})
+    summary_changed()
+
+
+def stock_changed(product_id, stock):
+    summary.stock_changed(product_id, stock=stock)
+    reference.patch('products', product_id, stock=int(stock))
+    events.publish('stock', {'id': int(product_id), 'stock': int(stock)})
+    summary_changed()
+
+
+def product_categories():
+    cached = {p['category'] for p in reference.all('products') if p.get('category')}
+    return CATEGORIES + sorted(cached - set(CATEGORIES))
+
+
+def summary_versions():
+    """Current change counters of the tables behind the dashboard summary, or None when unknown."""
+    stamps = table_versions.get()
+    if stamps is None:
+        return None
+    return {table: stamps.get(table, (None, None))[0] for table in summary.TABLES}
+
+
+def reconcile_summary(versions=None):
+    # Straight from the database: the reference cache may itself be behind another worker's writes
+    today = datetime.now().strftime('%Y-%m-%d')
+    results = queries.run({
+        'products': lambda: list(bulk_io.iter_table(supabase, 'products', ['id', 'name', 'price', 'stock'])),
+        'sales_today': lambda: list(bulk_io.iter_table(supabase, 'sales', ['id', 'total_price'],
+                                                       where=lambda q: q.gte('created_at', today))),
+    })
+    # A partial snapshot would corrupt the counters; keep the old ones until both reads succeed
+    if results['products'] is not None and results['sales_today'] is not None:
+        summary.reconcile(results['products'], results['sales_today'], versions)
+
+
 @app.route('/')
 @login_required
+@cached_page(('products', 'sales'))
 def dashboard():
     try:
-        products = supabase.table('products').select('*').execute().data or []
-        today = datetime.now().strftime('%Y-%m-%d')
-        sales_today_data = supabase.table('sales').select('*').gte('created_at', today).execute().data or []
-        total_products = len(products)
-        total_stock_value = sum(float(p.get('price', 0)) * int(p.get('stock', 0)) for p in products)
-        low_stock_items = [p for p in products if int(p.get('stock', 0)) <= 10]
-        low_stock_count = len(low_stock_items)
-        today_sales_revenue = sum(float(s.get('total_price', 0)) for s in sales_today_data)
-        return render_template('dashboard.html',
-            total_products=total_products,
-            total_stock_value=round(total_stock_value, 2),
-            low_stock_count=low_stock_count,
-            today_sales=round(today_sales_revenue, 2),
-            low_stock_items=low_stock_items,
-            products=products[:8])
+        versions = summary_versions()
+        if summary.needs_reconcile(versions):
+            reconcile_summary(versions)
+        return render_template('dashboard.html', **summary.snapshot())
     except Exception as e:
+        app.logger.exception('Dashboard failed to load its summary')
+        mark_degraded()
         return render_template('dashboard.html', total_products=0, total_stock_value=0, low_stock_count=0, today_sales=0)
 
 
 @app.route('/add-product', methods=['GET', 'POST'])
 @login_required
+@cached_page(('products',))
 def add_product():
     if request.method == 'POST':
         data = request.form
-        supabase.table('products').insert({
+        inserted = supabase.table('products').insert({
             'name': data['name'].strip(),
             'price': float(data['price']),
             'category': data['category'],
             'stock': int(data['stock'])
-        }).execute()
+        }).execute().data or []
+        for row in inserted:
+            product_saved(row)
         flash('Product added successfully', 'success')
         return redirect(url_for('inventory'))
-    return render_template('add_product.html', categories=CATEGORIES)
+    try:
+        categories = product_categories()
+    except Exception:
+        mark_degraded()
+        categories = CATEGORIES
+    return render_template('add_product.html', categories=categories)
 
 
 @app.route('/inventory')
 @login_required
+@cached_page(('products',))
 def inventory():
-    filter_type = request.args.get('filter', '')
-    if filter_type == 'low-stock':
-        products = supabase.table('products').select('*').lte('stock', 10).order('stock').execute().data or []
-        return render_template('inventory.html', products=products, filter=filter_type, total_value=0)
-    elif filter_type == 'stock-value':
-        products = supabase.table('products').select('*').order('name').execute().data or []
-        total_value = round(sum(float(p.get('price', 0)) * int(p.get('stock', 0)) for p in products), 2)
-        return render_template('inventory.html', products=products, filter=filter_type, total_value=total_value)
-    else:
-        products = supabase.table('products').select('*').order('name').execute().data or []
-        return render_template('inventory.html', products=products, filter=filter_type, total_value=0)
+    args = request.args
+    filter_type = args.get('filter', '')
+    batch = {'page': page_loader('inventory', args=args)}
+    if filter_type == 'stock-value':
+        batch['stock_rows'] = lambda: supabase.table('products').select('price, stock').execute().data or []
+    results = queries.run(batch, defaults={'page': ([], None), 'stock_rows': []})
+    products, next_cursor = results['page']
+    total_value = round(sum(float(p.get('price', 0)) * int(p.get('stock', 0)) for p in results.get('stock_rows') or []), 2)
+    return render_template('inventory.html', products=products, filter=filter_type, total_value=total_value,
+                           next_cursor=next_cursor)
 
 
 @app.route('/update-stock', methods=['POST'])
@@ -129,12 +527,104 @@ def inventory():
 def update_stock():
     try:
         data = request.get_json()
-        supabase.table('products').update({'stock': int(data.get('stock'))}).eq('id', data.get('id')).execute()
+        change = {'id': int(data.get('id')), 'stock': int(data.get('stock'))}
+        result = (supabase.rpc('bulk_adjust_stock', {'p_changes': [change]}).execute().data or [{}])[0]
+        if not result.get('success'):
+            return jsonify({"success": False, "error": result.get('error', 'Stock update failed')}), 400
+        stock_changed(result['id'], result['stock'])
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+MAX_BULK_STOCK_CHANGES = 1000
+
+
+@app.route('/update-stock/bulk', methods=['POST'])
+@login_required
+def update_stock_bulk():
+    data = request.get_json() or {}
+    changes = data.get('changes') if isinstance(data, dict) else data
+    if not isinstance(changes, list) or not changes:
+        return jsonify({"success": False, "error": "No changes provided"}), 400
+    if len(changes) > MAX_BULK_STOCK_CHANGES:
+        return jsonify({"success": False, "error": f"At most {MAX_BULK_STOCK_CHANGES} changes per batch"}), 400
+
+    # Fold repeated ids into one change: an absolute stock resets, deltas accumulate on top.
+    # `order` keeps each bad change, or the first sighting of each id, where it was submitted.
+    merged, order = {}, []
+    for change in changes:
+        try:
+            p_id = int(change['id'])
+            stock = int(change['stock']) if change.get('stock') not in (None, '') else None
+            delta = int(change.get('delta') or 0)
+            if stock is None and 'delta' not in change:
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            order.append({'id': change.get('id') if isinstance(change, dict) else None,
+                          'success': False, 'error': 'Expected {id, stock} or {id, delta}'})
+            continue
+        if p_id not in merged:
+            order.append(p_id)
+        entry = merged.setdefault(p_id, {'id': p_id, 'stock': None, 'delta': 0})
+        if stock is not None:
+            entry['stock'], entry['delta'] = stock, 0
+        entry['delta'] += delta
+    payload = [{'id': e['id'], 'stock': e['stock'] + e['delta']} if e['stock'] is not None
+               else {'id': e['id'], 'delta': e['delta']} for e in merged.values()]
+
+    try:
+        applied = (supabase.rpc('bulk_adjust_stock', {'p_changes': payload}).execute().data or []) if payload else []
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    by_id = {row['id']: row for row in applied}
+    results = [item if isinstance(item, dict) else by_id.get(item, {'id': item, 'success': False, 'error': 'Not applied'})
+               for item in order]
+    for row in results:
+        if row.get('success'):
+            stock_changed(row['id'], row['stock'])
+    return jsonify({"success": all(r.get('success') for r in results), "results": results})
+
+
+@app.route('/stock/history/<int:product_id>')
+@login_required
+def stock_history(product_id):
+    """Ledger movements for one product, newest first, plus its stock as of `at` (default now)."""
+    try:
+        at = request.args.get('at') or datetime.now().isoformat()
+        limit = min(int(request.args.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        results = queries.run({
+            'stock': lambda: supabase.rpc('stock_as_of', {'p_at': at, 'p_product_id': product_id}).execute().data or [],
+            'movements': lambda: supabase.table('stock_movements').select('*').eq('product_id', product_id)
+                                 .lte('created_at', at).order('id', desc=True).limit(limit).execute().data or [],
+        }, defaults={'stock': [], 'movements': []})
+        stock = results['stock'][0]['stock'] if results['stock'] else None
+        return jsonify({'success': True, 'product_id': product_id, 'at': at, 'stock': stock,
+                        'movements': results['movements']})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/stock/as-of')
+@login_required
+def stock_as_of():
+    at = request.args.get('at')
+    if not at:
+        return jsonify({'success': False, 'error': 'Pass ?at=YYYY-MM-DD[THH:MM:SS]'}), 400
+    try:
+        rows = supabase.rpc('stock_as_of', {'p_at': at}).execute().data or []
+        return jsonify({'success': True, 'at': at, 'stock': {str(r['product_id']): r['stock'] for r in rows}})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.cli.command('snapshot-stock')
+def snapshot_stock_command():
+    """Snapshot every product's stock so ledger replays start from here (run nightly)."""
+    count = supabase.rpc('snapshot_stock', {}).execute().data
+    click.echo(f'Snapshotted stock for {count} product(s)')
+
+
 @app.route('/delete-product', methods=['POST'])
 @login_required
 def delete_product():
@@ -144,48 +634,122 @@ def delete_product():
         if not p_id:
             return jsonify({"success": False, "error": "No ID provided"}), 400
         supabase.table('products').delete().eq('id', p_id).execute()
+        product_deleted(p_id)
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+class CheckoutError(ValueError):
+    """A cart the checkout RPC rejected: bad input, short stock or an unusable discount code."""
+
+
+def checkout_cart(items, customer_id=None, discount_code=None, payment_method='Cash', amount_paid=None):
+    """Validate and commit a whole cart in one `checkout_cart` RPC; returns its result payload."""
+    cart = {}
+    for item in items or []:
+        try:
+            product_id, quantity = int(item['product_id']), int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError('Each cart line needs a product_id and an integer quantity')
+        if quantity < 1:
+            raise CheckoutError('Quantity must be at least 1')
+        cart[product_id] = cart.get(product_id, 0) + quantity
+    if not cart:
+        raise CheckoutError('Cart is empty')
+    if (discount_code or '').strip():
+        # Reject a bad code from memory; checkout_cart re-validates it in the same transaction as the sale
+        products = [reference.get('products', pid) for pid in cart]
+        if all(products):
+            subtotal = sum(float(p['price']) * cart[p['id']] for p in products)
+            try:
+                discount_codes.quote(discount_code, subtotal)
+            except DiscountError as e:
+                raise CheckoutError(str(e))
+
+    try:
+        result = supabase.rpc('checkout_cart', {
+            'p_items': [{'product_id': pid, 'quantity': qty} for pid, qty in cart.items()],
+            'p_customer_id': int(customer_id) if customer_id else None,
+            'p_discount_code': (discount_code or '').strip().upper() or None,
+            'p_payment_method': payment_method or 'Cash',
+            'p_amount_paid': float(amount_paid) if amount_paid not in (None, '') else None,
+        }).execute().data
+    except Exception as e:
+        message = getattr(e, 'message', None) or str(e)
+        if message.startswith(('Insufficient stock', 'Invalid', 'Discount', 'Cart is empty')):
+            raise CheckoutError(message)
+        raise
+
+    summary.sale_recorded(result['subtotal'])
+    for line in result['lines']:
+        stock_changed(line['product_id'], line['stock'])
+    events.publish('sale', {
+        'order_id': result['order_id'],
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'lines': [{'id': sale_id, 'product_id': line['product_id'], 'quantity': line['quantity'],
+                   'total_price': line['total_price']} for sale_id, line in zip(result['sale_ids'], result['lines'])],
+    })
+    return result
+
+
+@app.route('/checkout', methods=['POST'])
+@login_required
+def checkout():
+    data = request.get_json() or {}
+    try:
+        result = checkout_cart(data.get('items'), customer_id=data.get('customer_id'),
+                               discount_code=data.get('discount_code'),
+                               payment_method=data.get('payment_method'),
+                               amount_paid=data.get('amount_paid'))
+        sale_ids = result.get('sale_ids') or []
+        return jsonify({'success': True, 'order_id': result['order_id'], 'sale_ids': sale_ids,
+                        'subtotal': result['subtotal'], 'discount': result['discount'],
+                        'invoice_url': url_for('invoice', sale_id=sale_ids[0]) if sale_ids else None})
+    except CheckoutError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/sales', methods=['GET', 'POST'])
 @login_required
+@cached_page(('sales',))
 def sales():
     if request.method == 'POST':
         data = request.get_json() if request.is_json else request.form
         try:
-            product = supabase.table('products').select('*').eq('id', data['product_id']).single().execute().data
-            quantity = int(data['quantity'])
-            if product and product['stock'] >= quantity:
-                total_price = product['price'] * quantity
-                supabase.table('sales').insert({
-                    'product_id': product['id'],
-                    'quantity': quantity,
-                    'total_price': total_price
-                }).execute()
-                supabase.table('products').update({'stock': product['stock'] - quantity}).eq('id', product['id']).execute()
-                if request.is_json:
-                    return jsonify({"success": True})
-                flash('Sale recorded successfully', 'success')
-            else:
-                if request.is_json:
-                    return jsonify({"success": False, "error": "Insufficient stock"}), 400
-                flash('Insufficient stock', 'danger')
+            checkout_cart([{'product_id': data['product_id'], 'quantity': data['quantity']}],
+                          discount_code=data.get('discount_code'))
+            if request.is_json:
+                return jsonify({"success": True})
+            flash('Sale recorded successfully', 'success')
+        except CheckoutError as e:
+            if request.is_json:
+                return jsonify({"success": False, "error": str(e)}), 400
+            flash(str(e), 'danger')
         except Exception as e:
             if request.is_json:
                 return jsonify({"success": False, "error": str(e)}), 500
             flash(f'Error: {str(e)}', 'danger')
         return redirect(url_for('sales'))
-    products  = supabase.table('products').select('*').execute().data or []
-    filter_type = request.args.get('filter')
-    if filter_type == 'today':
-        today_str = datetime.now().strftime('%Y-%m-%d')
-        sales_list = supabase.table('sales').select('*').gte('created_at', today_str).order('created_at', desc=True).execute().data or []
-    else:
-        sales_list = supabase.table('sales').select('*').order('created_at', desc=True).execute().data or []
-    customers_list = supabase.table('customers').select('*').order('name').execute().data or []
-    return render_template('sales.html', products=products, sales=sales_list, filter=filter_type, customers=customers_list)
+    # Products and customers are picked through /api/search, not rendered in full
+    sales_list, next_cursor = list_page('sales')
+    return render_template('sales.html', sales=sales_list, filter=request.args.get('filter'), next_cursor=next_cursor)
+
+
+@app.route('/api/search/<kind>')
+@login_required
+def search_api(kind):
+    index = search_indexes.get(kind)
+    if index is None:
+        return jsonify({'success': False, 'error': f'Unknown search: {kind}'}), 404
+    try:
+        reference.generation(kind)  # reloads the table, and so the index, when it is stale
+        limit = min(max(request.args.get('limit', SEARCH_LIMIT, type=int), 1), MAX_SEARCH_LIMIT)
+        return jsonify({'success': True, 'rows': index.search(request.args.get('q', ''), limit)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/invoice/preview')
@@ -218,62 +782,146 @@ def invoice_preview():
     return render_template('invoice.html', invoice=invoice_data)
 
 
+INVOICE_CACHE_SIZE = int(os.getenv('INVOICE_CACHE_SIZE', 2000))
+MAX_INVOICE_BATCH_DAYS = 31
+# sale id -> (etag, rendered page); an issued invoice never changes, so entries only leave by eviction
+invoice_pages = LRUCache(maxsize=INVOICE_CACHE_SIZE)
+invoice_pages_lock = threading.Lock()
+
+
+def build_invoice(lines):
+    """Invoice data for the sale lines of one order, plus a hash of its content for the ETag."""
+    sale_items = []
+    for line in lines:
+        product = reference.get('products', line['product_id'])
+        qty     = int(line['quantity'])
+        total   = float(line['total_price'])
+        sale_items.append({
+            'name': product['name'] if product else 'Unknown',
+            'qty': qty,
+            'unit': (product.get('unit') or 'pcs') if product else 'pcs',
+            # Price at the time of sale, so a later price change doesn't rewrite the invoice
+            'rate': round(total / qty, 2) if qty else 0,
+            'total': total
+        })
+    first       = lines[0]
+    subtotal    = round(sum(item['total'] for item in sale_items), 2)
+    tax         = round(subtotal * 0.05, 2)
+    discount    = float(first.get('discount') or 0)
+    grand       = round(subtotal + tax - discount, 2)
+    amount_paid = float(first.get('amount_paid') or grand)
+    change      = round(max(amount_paid - grand, 0), 2)
+    invoice_data = {
+        'invoice_number': f"INV-{str(first.get('order_id') or first['id'])[:8].upper()}",
+        'datetime': first.get('created_at', datetime.now().isoformat()),
+        'payment_method': first.get('payment_method') or 'Cash',
+        'discount_code': first.get('discount_code'),
+        'subtotal': subtotal, 'tax': tax, 'discount': discount,
+        'grand': grand, 'amount_paid': amount_paid, 'change': change,
+        'sale_items': sale_items
+    }
+    etag = hashlib.sha256(json.dumps(invoice_data, sort_keys=True, default=str).encode()).hexdigest()[:32]
+    return invoice_data, etag
+
+
+def invoice_response(etag, html=None):
+    response = Response(html or '', status=200 if html is not None else 304, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @app.route('/invoice/<sale_id>')
 @login_required
 def invoice(sale_id):
+    with invoice_pages_lock:
+        cached = invoice_pages.get(sale_id)
+    if cached:
+        etag, html = cached
+        return invoice_response(etag, None if request.if_none_match.contains_weak(etag) else html)
     try:
         sale = supabase.table('sales').select('*').eq('id', sale_id).single().execute().data
         if not sale:
             flash('Invoice not found.', 'danger')
             return redirect(url_for('sales'))
-        product = supabase.table('products').select('*').eq('id', sale['product_id']).single().execute().data
-        qty     = int(sale['quantity'])
-        rate    = float(product['price']) if product else 0
-        total   = float(sale['total_price'])
-        subtotal    = total
-        tax         = round(subtotal * 0.05, 2)
-        discount    = float(sale.get('discount', 0))
-        grand       = round(subtotal + tax - discount, 2)
-        amount_paid = float(sale.get('amount_paid', grand))
-        change      = round(max(amount_paid - grand, 0), 2)
-        invoice_data = {
-            'invoice_number': f"INV-{str(sale_id)[:8].upper()}",
-            'datetime': sale.get('created_at', datetime.now().isoformat()),
-            'payment_method': sale.get('payment_method', 'Cash'),
-            'subtotal': subtotal, 'tax': tax, 'discount': discount,
-            'grand': grand, 'amount_paid': amount_paid, 'change': change,
-            'sale_items': [{
-                'name': product['name'] if product else 'Unknown',
-                'qty': qty,
-                'unit': product.get('unit', 'pcs') if product else 'pcs',
-                'rate': rate, 'total': total
-            }]
-        }
-        return render_template('invoice.html', invoice=invoice_data)
+        lines = [sale]
+        if sale.get('order_id'):
+            lines = supabase.table('sales').select('*').eq('order_id', sale['order_id']).order('id').execute().data or [sale]
+        invoice_data, etag = build_invoice(lines)
+        if request.if_none_match.contains_weak(etag):
+            return invoice_response(etag)
+        html = render_template('invoice.html', invoice=invoice_data)
+        with invoice_pages_lock:
+            invoice_pages[sale_id] = (etag, html)
+        return invoice_response(etag, html)
     except Exception as e:
         flash(f'Error: {str(e)}', 'danger')
         return redirect(url_for('sales'))
 
 
+def sales_on(day):
+    """Every sale line created on one day, one keyset page on id at a time."""
+    start, end = day.isoformat(), (day + timedelta(days=1)).isoformat()
+    rows, last_id = [], 0
+    while True:
+        page = (supabase.table('sales').select('*').gte('created_at', start).lt('created_at', end)
+                .gt('id', last_id).order('id').limit(bulk_io.EXPORT_PAGE_SIZE).execute().data or [])
+        rows += page
+        if len(page) < bulk_io.EXPORT_PAGE_SIZE:
+            return rows
+        last_id = page[-1]['id']
+
+
+@app.route('/invoices/batch')
+@login_required
+def invoice_batch():
+    """All invoices for ?date= or ?from=&to= (inclusive) in one printable document."""
+    try:
+        start = datetime.strptime(request.args.get('from') or request.args['date'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.args.get('to') or str(start), '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Pass ?date=YYYY-MM-DD or ?from=YYYY-MM-DD&to=YYYY-MM-DD'}), 400
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    if not days or len(days) > MAX_INVOICE_BATCH_DAYS:
+        return jsonify({'error': f'Range must cover 1 to {MAX_INVOICE_BATCH_DAYS} days'}), 400
+
+    # Each day is fetched on the shared query pool, so a month costs about as long as its busiest day
+    results = queries.run({str(day): (lambda d=day: sales_on(d)) for day in days}, timeout=max(queries.timeout, 60))
+    missing = [day for day, rows in results.items() if rows is None]
+    if missing:
+        return jsonify({'error': f'Could not load sales for {", ".join(missing)}'}), 503
+
+    orders = {}
+    for day in sorted(results):
+        for line in results[day]:
+            orders.setdefault(line.get('order_id') or f"sale:{line['id']}", []).append(line)
+    invoices = [build_invoice(lines)[0] for lines in orders.values()]
+    title = str(start) if start == end else f'{start} to {end}'
+    return render_template('invoice.html', invoices=invoices, batch_title=f'{len(invoices)} invoices · {title}')
+
+
 @app.route('/customers', methods=['GET', 'POST'])
 @login_required
+@cached_page(('customers',))
 def customers():
     if request.method == 'POST':
         data = request.form
         try:
-            supabase.table('customers').insert({
+            created = supabase.table('customers').insert({
                 'name': data['name'].strip(),
                 'phone': data.get('phone', '').strip() or None,
                 'email': data.get('email', '').strip() or None,
                 'address': data.get('address', '').strip() or None
-            }).execute()
+            }).execute().data
+            if created:
+                reference.upsert('customers', created[0])
             flash('Customer added successfully!', 'success')
         except Exception as e:
             flash(f'Error: {str(e)}', 'danger')
         return redirect(url_for('customers'))
-    customers_list = supabase.table('customers').select('*').order('created_at', desc=True).execute().data or []
+    customers_list, next_cursor = list_page('customers')
     now = datetime.now().strftime('%d %b %Y')
-    return render_template('customers.html', customers=customers_list, now=now)
+    return render_template('customers.html', customers=customers_list, now=now, next_cursor=next_cursor)
 
 
 @app.route('/customers/delete', methods=['POST'])
@@ -282,6 +930,7 @@ def delete_customer():
     try:
         data = request.get_json()
         supabase.table('customers').delete().eq('id', data['id']).execute()
+        reference.remove('customers', data['id'])
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -289,11 +938,12 @@ def delete_customer():
 
 @app.route('/discounts', methods=['GET', 'POST'])
 @login_required
+@cached_page(('discounts',))
 def discounts():
     if request.method == 'POST':
         data = request.form
         try:
-            supabase.table('discounts').insert({
+            created = supabase.table('discounts').insert({
                 'code': data['code'].strip().upper(),
                 'description': data.get('description', '').strip() or None,
                 'discount_type': data['discount_type'],
@@ -301,13 +951,15 @@ def discounts():
                 'min_order_value': float(data.get('min_order_value') or 0),
                 'expires_at': data.get('expires_at') or None,
                 'is_active': True
-            }).execute()
+            }).execute().data
+            if created:
+                reference.upsert('discounts', created[0])
             flash('Discount created successfully!', 'success')
         except Exception as e:
             flash(f'Error: {str(e)}', 'danger')
         return redirect(url_for('discounts'))
-    discounts_list = supabase.table('discounts').select('*').order('created_at', desc=True).execute().data or []
-    return render_template('discounts.html', discounts=discounts_list)
+    discounts_list, next_cursor = list_page('discounts')
+    return render_template('discounts.html', discounts=discounts_list, next_cursor=next_cursor)
 
 
 @app.route('/discounts/delete', methods=['POST'])
@@ -316,6 +968,7 @@ def delete_discount():
     try:
         data = request.get_json()
         supabase.table('discounts').delete().eq('id', data['id']).execute()
+        reference.remove('discounts', data['id'])
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -326,14 +979,41 @@ def delete_discount():
 def toggle_discount():
     try:
         data = request.get_json()
-        supabase.table('discounts').update({'is_active': data['is_active']}).eq('id', data['id']).execute()
+        is_active = data.get('is_active')
+        if is_active is None:
+            # The discounts page sends only the id: flip the current state
+            current = supabase.table('discounts').select('is_active').eq('id', data['id']).single().execute().data
+            is_active = not current['is_active']
+        supabase.table('discounts').update({'is_active': bool(is_active)}).eq('id', data['id']).execute()
+        reference.patch('discounts', data['id'], is_active=bool(is_active))
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/discounts/quote')
+@login_required
+def quote_discount():
+    try:
+        discount = discount_codes.quote(request.args.get('code'), request.args.get('subtotal', 0, type=float))
+        return jsonify({'success': True, 'discount': discount})
+    except DiscountError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
+# Sales velocity kept up to date from new sales; drives the reorder suggestions below
+reorder = ReorderPlanner(supabase, reference,
+                         window_days=int(os.getenv('REORDER_WINDOW_DAYS', 28)),
+                         lead_days=int(os.getenv('REORDER_LEAD_DAYS', 7)),
+                         safety_days=int(os.getenv('REORDER_SAFETY_DAYS', 3)),
+                         cover_days=int(os.getenv('REORDER_COVER_DAYS', 14)),
+                         refresh_seconds=int(os.getenv('REORDER_REFRESH_SECONDS', 300)))
+MAX_BULK_ORDERS = 500
+
+
 @app.route('/purchase-orders', methods=['GET', 'POST'])
 @login_required
+@cached_page(('purchase_orders', 'products', 'suppliers'))
 def purchase_orders():
     if request.method == 'POST':
         data = request.form
@@ -350,9 +1030,15 @@ def purchase_orders():
         except Exception as e:
             flash(f'Error: {str(e)}', 'danger')
         return redirect(url_for('purchase_orders'))
-    raw_orders   = supabase.table('purchase_orders').select('*').order('created_at', desc=True).execute().data or []
-    products     = supabase.table('products').select('id, name, stock').execute().data or []
-    suppliers    = supabase.table('suppliers').select('id, name').execute().data or []
+    args = request.args
+    results = queries.run({
+        'page': page_loader('purchase_orders', args=args),
+        'products': lambda: reference.all('products'),
+        'suppliers': lambda: reference.all('suppliers'),
+    }, defaults={'page': ([], None), 'products': [], 'suppliers': []})
+    raw_orders, next_cursor = results['page']
+    products     = sorted(results['products'], key=lambda p: p.get('name') or '')
+    suppliers    = sorted(results['suppliers'], key=lambda s: s.get('name') or '')
     product_map  = {p['id']: p['name'] for p in products}
     supplier_map = {s['id']: s['name'] for s in suppliers}
     orders = []
@@ -361,7 +1047,47 @@ def purchase_orders():
         o['supplier_name'] = supplier_map.get(o.get('supplier_id'), '-')
         orders.append(o)
     today = datetime.now().strftime('%Y-%m-%d')
-    return render_template('purchase_orders.html', orders=orders, products=products, suppliers=suppliers, today=today)
+    return render_template('purchase_orders.html', orders=orders, products=products, suppliers=suppliers, today=today,
+                           next_cursor=next_cursor)
+
+
+@app.route('/purchase-orders/suggestions')
+@login_required
+def reorder_suggestions():
+    try:
+        supplier_id = request.args.get('supplier_id', type=int)
+        return jsonify({'success': True, 'suppliers': reorder.suggestions(supplier_id)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/purchase-orders/bulk', methods=['POST'])
+@login_required
+def bulk_purchase_orders():
+    items = (request.get_json(silent=True) or {}).get('items') or []
+    if not items:
+        return jsonify({'success': False, 'error': 'No orders to place'}), 400
+    if len(items) > MAX_BULK_ORDERS:
+        return jsonify({'success': False, 'error': f'At most {MAX_BULK_ORDERS} orders per batch'}), 400
+    today = datetime.now().strftime('%Y-%m-%d')
+    try:
+        rows = [{
+            'product_id': int(item['product_id']),
+            'supplier_id': int(item['supplier_id']),
+            'quantity': int(item['quantity']),
+            'unit_cost': float(item['unit_cost']),
+            'status': 'Pending',
+            'order_date': item.get('order_date') or today,
+        } for item in items]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Every order needs a product, supplier, quantity and unit cost'}), 400
+    if any(row['quantity'] < 1 or row['unit_cost'] < 0 for row in rows):
+        return jsonify({'success': False, 'error': 'Quantities must be positive and costs not negative'}), 400
+    try:
+        created = supabase.table('purchase_orders').insert(rows).execute().data or []
+        return jsonify({'success': True, 'created': len(created)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/purchase-orders/status', methods=['POST'])
@@ -369,14 +1095,9 @@ def purchase_orders():
 def update_order_status():
     try:
         data   = request.get_json()
-        status = data['status']
-        supabase.table('purchase_orders').update({'status': status}).eq('id', data['id']).execute()
-        if status == 'Received':
-            order   = supabase.table('purchase_orders').select('*').eq('id', data['id']).single().execute().data
-            product = supabase.table('products').select('stock').eq('id', order['product_id']).single().execute().data
-            if product:
-                new_stock = int(product['stock']) + int(order['quantity'])
-                supabase.table('products').update({'stock': new_stock}).eq('id', order['product_id']).execute()
+        result = supabase.rpc('transition_purchase_order', {'p_order_id': int(data['id']), 'p_status': data['status']}).execute().data
+        if result.get('stock') is not None:
+            stock_changed(result['product_id'], result['stock'])
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -398,23 +1119,26 @@ def delete_order():
 
 @app.route('/suppliers', methods=['GET', 'POST'])
 @login_required
+@cached_page(('suppliers',))
 def suppliers():
     if request.method == 'POST':
         data = request.form
         try:
-            supabase.table('suppliers').insert({
+            inserted = supabase.table('suppliers').insert({
                 'name': data['name'].strip(),
                 'phone': data.get('phone', '').strip() or None,
                 'email': data.get('email', '').strip() or None,
                 'address': data.get('address', '').strip() or None,
                 'product_type': data.get('product_type', '').strip() or None
-            }).execute()
+            }).execute().data or []
+            for row in inserted:
+                reference.upsert('suppliers', {'id': row['id'], 'name': row.get('name')})
             flash('Supplier added successfully!', 'success')
         except Exception as e:
             flash(f'Error: {str(e)}', 'danger')
         return redirect(url_for('suppliers'))
-    suppliers_list = supabase.table('suppliers').select('*').order('created_at', desc=True).execute().data or []
-    return render_template('suppliers.html', suppliers=suppliers_list)
+    suppliers_list, next_cursor = list_page('suppliers')
+    return render_template('suppliers.html', suppliers=suppliers_list, next_cursor=next_cursor)
 
 
 @app.route('/suppliers/delete', methods=['POST'])
@@ -423,12 +1147,14 @@ def delete_supplier():
     try:
         data = request.get_json()
         supabase.table('suppliers').delete().eq('id', data['id']).execute()
+        reference.remove('suppliers', data['id'])
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/returns', methods=['GET', 'POST'])
 @login_required
+@cached_page(('returns', 'products', 'sales'))
 def returns():
     if request.method == 'POST':
         data = request.form
@@ -446,13 +1172,20 @@ def returns():
             flash(f'Error: {str(e)}', 'danger')
         return redirect(url_for('returns'))
 
-    raw_returns = supabase.table('returns').select('*').order('created_at', desc=True).execute().data or []
-    products    = supabase.table('products').select('id, name').execute().data or []
-    sales       = supabase.table('sales').select('id, total_price, created_at').order('created_at', desc=True).execute().data or []
+    args = request.args
+    results = queries.run({
+        'page': page_loader('returns', args=args),
+        'products': lambda: reference.all('products'),
+        'sales': lambda: supabase.table('sales').select('id, total_price, created_at').order('created_at', desc=True).limit(MAX_PAGE_SIZE).execute().data or [],
+    }, defaults={'page': ([], None), 'products': [], 'sales': []})
+    raw_returns, next_cursor = results['page']
+    products    = sorted(results['products'], key=lambda p: p.get('name') or '')
+    sales       = results['sales']
     product_map = {p['id']: p['name'] for p in products}
     for r in raw_returns:
         r['product_name'] = product_map.get(r.get('product_id'), '-')
-    return render_template('returns.html', returns=raw_returns, products=products, sales=sales)
+    return render_template('returns.html', returns=raw_returns, products=products, sales=sales,
+                           next_cursor=next_cursor)
 
 
 @app.route('/returns/status', methods=['POST'])
@@ -460,14 +1193,9 @@ def returns():
 def update_return_status():
     try:
         data   = request.get_json()
-        status = data['status']
-        supabase.table('returns').update({'status': status}).eq('id', data['id']).execute()
-        if status == 'Approved':
-            ret     = supabase.table('returns').select('*').eq('id', data['id']).single().execute().data
-            product = supabase.table('products').select('stock').eq('id', ret['product_id']).single().execute().data
-            if product:
-                new_stock = int(product['stock']) + int(ret['quantity'])
-                supabase.table('products').update({'stock': new_stock}).eq('id', ret['product_id']).execute()
+        result = supabase.rpc('transition_return', {'p_return_id': int(data['id']), 'p_status': data['status']}).execute().data
+        if result.get('stock') is not None:
+            stock_changed(result['product_id'], result['stock'])
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -485,6 +1213,7 @@ def delete_return():
 
 @app.route('/expenses', methods=['GET', 'POST'])
 @login_required
+@cached_page(('expenses',))
 def expenses():
     if request.method == 'POST':
         data = request.form
@@ -501,31 +1230,283 @@ def expenses():
             flash(f'Error: {str(e)}', 'danger')
         return redirect(url_for('expenses'))
 
-    expenses_list = supabase.table('expenses').select('*').order('expense_date', desc=True).execute().data or []
+    args = request.args
+    today = datetime.now().strftime('%Y-%m-%d')
+    results = queries.run({
+        'page': page_loader('expenses', args=args),
+        'rollups': lambda: monthly_rollups('expenses'),
+        'today': lambda: supabase.table('expenses').select('amount').eq('expense_date', today).execute().data or [],
+    }, defaults={'page': ([], None), 'rollups': [], 'today': []})
+    expenses_list, next_cursor = results['page']
+    rollups = results['rollups']
 
-    total_expenses = round(sum(float(e.get('amount', 0)) for e in expenses_list), 2)
+    total_expenses = round(sum(float(r['total']) for r in rollups), 2)
 
     current_month = datetime.now().strftime('%Y-%m')
-    monthly_expenses = round(sum(
-        float(e.get('amount', 0)) for e in expenses_list
-        if e.get('expense_date', '').startswith(current_month)
-    ), 2)
+    monthly_expenses = round(sum(float(r['total']) for r in rollups if r['month'].startswith(current_month)), 2)
 
     category_totals = {}
-    for e in expenses_list:
-        cat = e.get('category', 'General')
-        category_totals[cat] = round(category_totals.get(cat, 0) + float(e.get('amount', 0)), 2)
+    for r in rollups:
+        category_totals[r['category']] = round(category_totals.get(r['category'], 0) + float(r['total']), 2)
 
     categories = list(category_totals.keys())
-    today = datetime.now().strftime('%Y-%m-%d')
+    today_expenses = round(sum(float(e['amount'] or 0) for e in results['today']), 2)
 
     return render_template('expenses.html',
         expenses=expenses_list,
+        total_entries=sum(r['entries'] for r in rollups),
         total_expenses=total_expenses,
         monthly_expenses=monthly_expenses,
+        today_expenses=today_expenses,
         category_totals=category_totals,
         categories=categories,
-        today=today)
+        today=today,
+        next_cursor=next_cursor)
+
+def monthly_rollups(source=None, start=None, end=None):
+    """Per-month, per-category totals kept by the expenses_rollup/returns_rollup triggers."""
+    query = supabase.table('monthly_rollups').select('source, month, category, total, entries')
+    if source:
+        query = query.eq('source', source)
+    if start:
+        query = query.gte('month', start[:7] + '-01')
+    if end:
+        query = query.lt('month', end)
+    return query.order('month').execute().data or []
+
+
+def profit_and_loss(start=None, end=None):
+    """Monthly revenue, approved refunds, expenses and net profit for months overlapping [start, end)."""
+    today = datetime.now().date()
+    results = queries.run({
+        'revenue': lambda: reports.revenue_by('month', start, end, today=today),
+        'rollups': lambda: monthly_rollups(start=start, end=end),
+    }, defaults={'revenue': [], 'rollups': []})
+    months = {}
+
+    def month(key):
+        return months.setdefault(key[:7], {'month': key[:7], 'revenue': 0.0, 'refunds': 0.0, 'expenses': 0.0,
+                                           'expense_categories': {}})
+    for row in results['revenue']:
+        month(row['period'])['revenue'] = row['revenue']
+    for row in results['rollups']:
+        entry = month(row['month'])
+        if row['source'] == 'refunds':
+            entry['refunds'] = round(entry['refunds'] + float(row['total']), 2)
+        else:
+            entry['expenses'] = round(entry['expenses'] + float(row['total']), 2)
+            entry['expense_categories'][row['category']] = float(row['total'])
+    rows = [months[key] for key in sorted(months)]
+    for entry in rows:
+        entry['net'] = round(entry['revenue'] - entry['refunds'] - entry['expenses'], 2)
+    return rows
+
+
+reports = SalesReports(supabase, refresh_seconds=int(os.getenv('REPORTS_REFRESH_SECONDS', 60)))
+REPORT_NAMES = ('revenue', 'top-products', 'category-mix', 'margin', 'profit-loss')
+
+
+def build_report(name, args):
+    """Run one sales report for the ?from=&to=&granularity=&by=&limit= query args."""
+    start, end = args.get('from') or None, args.get('to') or None
+    products = reference.all('products')
+    names = {int(p['id']): p['name'] for p in products}
+    if name == 'revenue':
+        return reports.revenue_by(args.get('granularity', 'day'), start, end, today=datetime.now().date())
+    if name == 'top-products':
+        limit = min(args.get('limit', 10, type=int), MAX_PAGE_SIZE)
+        return reports.top_products(start, end, by=args.get('by', 'revenue'), limit=limit, names=names)
+    if name == 'category-mix':
+        return reports.category_mix({int(p['id']): p.get('category') for p in products}, start, end)
+    if name == 'margin':
+        return reports.margin(start, end, names=names)
+    if name == 'profit-loss':
+        return profit_and_loss(start, end)
+    raise KeyError(name)
+
+
+@app.route('/reports')
+@login_required
+def reports_page():
+    args = request.args
+    context = {'granularity': args.get('granularity', 'day'), 'start': args.get('from', ''),
+               'end': args.get('to', '')}
+    try:
+        for name in REPORT_NAMES:
+            context[name.replace('-', '_')] = build_report(name, args)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        context.update(revenue=[], top_products=[], category_mix=[], margin=None, profit_loss=[])
+    return render_template('reports.html', **context)
+
+
+@app.route('/api/reports/<name>')
+@login_required
+def report_api(name):
+    if name not in REPORT_NAMES:
+        return jsonify({'error': f'Unknown report {name!r}'}), 404
+    try:
+        return jsonify(build_report(name, request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+analytics = AnalyticsSnapshot(supabase, path=os.getenv('ANALYTICS_DB_PATH'),
+                              refresh_seconds=int(os.getenv('ANALYTICS_REFRESH_SECONDS', 900)),
+                              timeout_seconds=float(os.getenv('ANALYTICS_TIMEOUT_SECONDS', 5)),
+                              row_cap=int(os.getenv('ANALYTICS_ROW_CAP', 10000)))
+SQL_PAGE_SIZE = 100
+
+
+@app.route('/sql-editor', methods=['GET', 'POST'])
+@login_required
+def sql_editor():
+    sql = request.form.get('sql') or request.args.get('sql')
+    page = request.form.get('page', request.args.get('page', 1), type=int)
+    context = {'query_executed': sql, 'page': page, 'has_more': False, 'page_size': SQL_PAGE_SIZE}
+    if sql:
+        try:
+            context['result'], context['has_more'] = analytics.page(sql, page, SQL_PAGE_SIZE)
+        except QueryError as e:
+            context['error'] = str(e)
+        except Exception as e:
+            app.logger.exception('SQL editor query failed')
+            context['error'] = f'Snapshot unavailable: {e}'
+    refreshed = analytics.refreshed_at()
+    context['snapshot_at'] = datetime.fromtimestamp(refreshed).strftime('%d %b %Y, %I:%M %p') if refreshed else None
+    return render_template('sql_editor.html', **context)
+
+
+@app.route('/sql-editor/export.csv', methods=['POST'])
+@login_required
+def sql_editor_export():
+    rows = analytics.iter_rows(request.form.get('sql'))
+    try:
+        first = next(rows, None)
+    except QueryError as e:
+        return Response(f'{e}\n', status=400, mimetype='text/plain')
+    columns = first[0] if first else []
+    failed = []
+
+    def generate():
+        if first:
+            yield first[1]
+            try:
+                for _, row in rows:
+                    yield row
+            except QueryError as e:
+                app.logger.warning('SQL editor export stopped early: %s', e)
+                failed.append(str(e))  # ends the rows cleanly so the buffered ones are still written
+
+    def body():
+        yield from bulk_io.stream_csv((dict(zip(columns, row)) for row in generate()), columns)
+        if failed:
+            # The 200 and headers are already sent: end the file with a row saying it is incomplete
+            yield bulk_io.csv_line(['ERROR', f'Export stopped early, rows above are incomplete: {failed[0]}'])
+    return Response(stream_with_context(body()), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=query.csv'})
+
+
+@app.cli.command('bump-versions')
+@click.argument('tables', nargs=-1, required=True)
+def bump_versions_command(tables):
+    """Mark tables as changed after writing to them outside the app (SQL console, other services)."""
+    bumped = reference.flush(tables)
+    if not bumped:
+        raise click.ClickException('Could not bump the cache_versions counters')
+    click.echo(', '.join(f'{name}={version}' for name, version in sorted(bumped.items())))
+
+
+@app.cli.command('refresh-analytics')
+def refresh_analytics_command():
+    """Rebuild the local analytics snapshot used by the SQL editor."""
+    analytics.refresh()
+    click.echo(f'Analytics snapshot written to {analytics.path}')
+
+
+def after_bulk_import(table):
+    # Imports bypass the per-row hooks; resync the derived stores wholesale. The bump also reaches
+    # the other workers and the page ETags, since the CLI import runs outside any request.
+    if table in reference.tables:
+        reference.invalidate(table)
+    reference.bump(table)
+    if table in ('products', 'sales'):
+        summary.mark_stale()
+    if table == 'sales':
+        with invoice_pages_lock:
+            invoice_pages.clear()
+
+
+@app.route('/import/<table>', methods=['POST'])
+@login_required
+def import_data(table):
+    if table not in bulk_io.SCHEMAS:
+        return jsonify({'success': False, 'error': f'Cannot import into {table}'}), 404
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+    fmt = request.form.get('format') or bulk_io.detect_format(upload.filename)
+    try:
+        report = bulk_io.import_records(supabase, table, bulk_io.iter_records(upload.stream, fmt))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Could not parse file: {e}'}), 400
+    after_bulk_import(table)
+    return jsonify({'success': report['failed'] == 0, **report})
+
+
+@app.route('/export/<table>.<fmt>')
+@login_required
+def export_data(table, fmt):
+    if table not in bulk_io.EXPORT_COLUMNS or fmt not in ('csv', 'json'):
+        return jsonify({'success': False, 'error': f'Cannot export {table}.{fmt}'}), 404
+    columns = bulk_io.EXPORT_COLUMNS[table]
+    rows = bulk_io.iter_table(supabase, table, columns)
+    body = bulk_io.stream_csv(rows, columns) if fmt == 'csv' else bulk_io.stream_json(rows)
+    filename = f"{table}-{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    return Response(stream_with_context(body),
+                    mimetype='text/csv' if fmt == 'csv' else 'application/json',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@app.cli.command('import-data')
+@click.argument('table', type=click.Choice(sorted(bulk_io.SCHEMAS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json', 'jsonl']), default=None)
+@click.option('--batch-size', default=bulk_io.IMPORT_BATCH_SIZE, show_default=True)
+def import_data_command(table, path, fmt, batch_size):
+    """Load a CSV/JSON file (e.g. data/products.json) into a table in batches."""
+    with open(path, 'rb') as f:
+        records = bulk_io.iter_records(f, fmt or bulk_io.detect_format(path))
+        report = bulk_io.import_records(supabase, table, records, batch_size=batch_size)
+    after_bulk_import(table)
+    click.echo(f"Inserted {report['inserted']} row(s), {report['failed']} failed")
+    for error in report['errors']:
+        click.echo(f"  row {error['row']}: {error['error']}", err=True)
+
+
+@app.cli.command('export-data')
+@click.argument('table', type=click.Choice(sorted(bulk_io.EXPORT_COLUMNS)))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.File('w'), default='-')
+def export_data_command(table, fmt, output):
+    """Stream a whole table to CSV/JSON, one page at a time."""
+    columns = bulk_io.EXPORT_COLUMNS[table]
+    rows = bulk_io.iter_table(supabase, table, columns)
+    for chunk in bulk_io.stream_csv(rows, columns) if fmt == 'csv' else bulk_io.stream_json(rows):
+        output.write(chunk)
+
+
+def create_app(config=None):
+    """WSGI entry point for production servers, e.g. `gunicorn 'app:create_app()'` or serve.py.
+
+    Not a factory: importing this module builds the one app, and this returns
+    it (with `config` applied). serve.py imports it in each worker after the
+    fork, which is what gives every worker its own clients and caches.
+    """
+    if config:
+        app.config.update(config)
+    return app
+
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Development server only; use serve.py to run with multiple workers
+    app.run(debug=os.getenv('FLASK_DEBUG', '1') == '1', host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""Drive the app's main routes with concurrent clients against the in-memory backend.
+
+    python bench/benchmark.py --products 2000 --sales 200000 --clients 8 --requests 200 --latency-ms 20
+
+Reports p50/p95/p99 latency and throughput per route, so every performance
+change can be compared against the same synthetic store.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def sale_payload(rng, product_ids):
+    return {'product_id': rng.choice(product_ids), 'quantity': 1}
+
+
+# name -> (method, path, JSON body factory or None)
+ROUTES = {
+    'dashboard': ('GET', '/', None),
+    'sales_post': ('POST', '/sales', sale_payload),
+    'inventory': ('GET', '/inventory', None),
+    'purchase_orders': ('GET', '/purchase-orders', None),
+    'returns': ('GET', '/returns', None),
+    'expenses': ('GET', '/expenses', None),
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def run_route(app, name, requests_per_route, clients, product_ids, seed):
+    method, path, body = ROUTES[name]
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        nonlocal errors
+        client = getattr(local, 'client', None) or app.test_client()
+        local.client = client
+        rng = random.Random(seed + i)
+        start = time.perf_counter()
+        if method == 'GET':
+            response = client.get(path)
+        else:
+            response = client.post(path, json=body(rng, product_ids))
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, range(requests_per_route)))
+    wall = time.perf_counter() - started
+    return {
+        'route': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        'rps': round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--sales', type=int, default=50000)
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--expenses', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients per route')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated Supabase round trip')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='comma separated subset of routes')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    os.environ['SUPABASE_BACKEND'] = 'memory'
+    os.environ['FAKE_SUPABASE_LATENCY_MS'] = str(args.latency_ms)
+    import app as app_module
+
+    app = app_module.app
+    app.config.update(LOGIN_DISABLED=True, TESTING=True)
+    backend = app_module.raw_supabase
+    backend.seed(products=args.products, sales=args.sales, customers=args.customers,
+                 expenses=args.expenses, seed=args.seed)
+    # Selling one unit per request must not run the catalog dry mid-benchmark
+    for product in backend.tables['products'].values():
+        product['stock'] += args.requests * len(ROUTES)
+    product_ids = list(backend.tables['products'])
+
+    results = []
+    for name in args.routes.split(','):
+        if name not in ROUTES:
+            parser.error(f'unknown route {name!r}; choose from {", ".join(ROUTES)}')
+        app.test_client().get(ROUTES[name][1])  # warm caches the way a live worker would be
+        results.append(run_route(app, name, args.requests, args.clients, product_ids, args.seed))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    header = f"{'route':<16}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['route']:<16}{r['requests']:>6}{r['errors']:>6}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['rps']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_PAGE_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+def _text(value):
+    value = (value or '').strip() if isinstance(value, str) else value
+    return value or None
+
+
+def _today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+# column -> (converter, required, default factory)
+SCHEMAS = {
+    'products': {
+        'name': (str.strip, True, None),
+        'price': (float, True, None),
+        'category': (_text, False, None),
+        'stock': (int, False, lambda: 0),
+        'unit': (_text, False, None),
+    },
+    'customers': {
+        'name': (str.strip, True, None),
+        'phone': (_text, False, None),
+        'email': (_text, False, None),
+        'address': (_text, False, None),
+    },
+    'expenses': {
+        'title': (str.strip, True, None),
+        'amount': (float, True, None),
+        'category': (_text, False, lambda: 'General'),
+        'note': (_text, False, None),
+        'expense_date': (_text, False, _today),
+    },
+    'sales': {
+        'product_id': (int, True, None),
+        'quantity': (int, True, None),
+        'total_price': (float, True, None),
+        'customer_id': (int, False, None),
+        'created_at': (_text, False, None),
+    },
+}
+
+EXPORT_COLUMNS = {
+    'products': ['id', 'name', 'price', 'category', 'stock', 'unit', 'created_at'],
+    'customers': ['id', 'name', 'phone', 'email', 'address', 'created_at'],
+    'expenses': ['id', 'title', 'amount', 'category', 'note', 'expense_date', 'created_at'],
+    'sales': ['id', 'order_id', 'product_id', 'quantity', 'total_price', 'customer_id',
+              'discount', 'payment_method', 'created_at'],
+}
+
+
+def detect_format(filename, default='csv'):
+    ext = (filename or '').rsplit('.', 1)[-1].lower()
+    return {'csv': 'csv', 'json': 'json', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(ext, default)
+
+
+def iter_records(stream, fmt):
+    """Yield dicts from a binary or text stream without reading it all into memory."""
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from _iter_json_array(stream)
+
+
+def _iter_json_array(stream, chunk_size=64 * 1024):
+    # Incrementally decode the elements of a top-level JSON array
+    decoder = json.JSONDecoder()
+    buf, pos, started, eof = '', 0, False, False
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if not started and pos < len(buf):
+            if buf[pos] != '[':
+                raise ValueError('Expected a JSON array of objects')
+            started, pos = True, pos + 1
+            continue
+        if started and pos < len(buf) and buf[pos] == ']':
+            return
+        try:
+            if pos >= len(buf):
+                raise ValueError
+            obj, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                if buf[pos:].strip():
+                    raise ValueError('Truncated or malformed JSON array')
+                return
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        # A number or literal cut at a chunk boundary can decode early; wait for its delimiter
+        if end == len(buf) and not eof:
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield obj
+        pos = end
+
+
+def clean_record(table, record):
+    row = {}
+    for column, (convert, required, default) in SCHEMAS[table].items():
+        value = record.get(column)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            if required:
+                raise ValueError(f'Missing required column "{column}"')
+            if default:
+                row[column] = default()
+            continue
+        row[column] = convert(value)
+    return row
+
+
+def import_records(client, table, records, batch_size=IMPORT_BATCH_SIZE):
+    """Validate and insert records in batches; returns a row-level report.
+
+    A batch the database rejects is retried row by row so a single bad row
+    doesn't sink its neighbours.
+    """
+    report = {'inserted': 0, 'failed': 0, 'errors': []}
+
+    def fail(row_number, error):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row_number, 'error': str(error)})
+
+    numbered = enumerate(records, start=1)
+    while True:
+        chunk = list(islice(numbered, batch_size))
+        if not chunk:
+            return report
+        batch = []
+        for row_number, record in chunk:
+            try:
+                batch.append((row_number, clean_record(table, record)))
+            except (TypeError, ValueError, AttributeError) as e:
+                fail(row_number, e)
+        if not batch:
+            continue
+        try:
+            client.table(table).insert([row for _, row in batch]).execute()
+            report['inserted'] += len(batch)
+        except Exception:
+            for row_number, row in batch:
+                try:
+                    client.table(table).insert(row).execute()
+                    report['inserted'] += 1
+                except Exception as e:
+                    fail(row_number, getattr(e, 'message', None) or e)
+
+
+def iter_table(client, table, columns, page_size=EXPORT_PAGE_SIZE, after_id=None, where=None):
+    """Yield every row of a table (or every row with id > after_id), one keyset page on id at a time.
+
+    `where` narrows each page query, e.g. `lambda q: q.gte('created_at', since)`.
+    """
+    last_id = after_id
+    while True:
+        query = client.table(table).select(', '.join(columns)).order('id').limit(page_size)
+        if where is not None:
+            query = where(query)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        rows = query.execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def csv_line(values):
+    buf = io.StringIO()
+    csv.writer(buf).writerow(values)
+    return buf.getvalue()
+
+
+def stream_csv(rows, columns):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % 500 == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def stream_json(rows):
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',\n' if i else '\n') + json.dumps(row, default=str)
+    yield '\n]\n'
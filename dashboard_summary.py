@@ -0,0 +1,123 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+
+from reference_cache import row_key
+
+LOW_STOCK_THRESHOLD = 10
+
+
+class DashboardSummary:
+    """Dashboard counters kept up to date by deltas from the mutation routes.
+
+    The store is rebuilt from the source tables on first use, whenever the
+    `products` or `sales` change counter moves past the value this worker last
+    accounted for (a write by another worker or an import), and at the latest
+    every `reconcile_seconds`.
+    """
+
+    TABLES = ('products', 'sales')
+
+    def __init__(self, reconcile_seconds=300, low_stock_limit=20):
+        self.reconcile_seconds = reconcile_seconds
+        self.low_stock_limit = low_stock_limit
+        self.lock = threading.Lock()
+        self.products = {}
+        self.low_stock_ids = set()
+        self.total_stock_value = 0.0
+        self.today = None
+        self.today_sales = 0.0
+        self.reconciled_at = 0.0
+        self.versions = {}  # table -> change counter the counters reflect
+
+    def needs_reconcile(self, versions=None):
+        """`versions` are the current change counters of TABLES, when known."""
+        if versions and any(versions.get(t) is not None and versions.get(t) != self.versions.get(t)
+                            for t in self.TABLES):
+            return True
+        return (time.time() - self.reconciled_at > self.reconcile_seconds
+                or self.today != datetime.now().strftime('%Y-%m-%d'))
+
+    def writes_stamped(self, bumped):
+        """This worker bumped `bumped` ({table: new counter}) for writes whose deltas it already applied.
+
+        Only a bump by exactly one keeps the counters current; a bigger jump
+        means another worker wrote in between, so the next read reconciles.
+        """
+        with self.lock:
+            for table in self.TABLES:
+                seen = self.versions.get(table)
+                if table in bumped and seen is not None and bumped[table] == seen + 1:
+                    self.versions[table] = bumped[table]
+
+    def mark_stale(self):
+        with self.lock:
+            self.reconciled_at = 0.0
+
+    def reconcile(self, products, today_sales_rows, versions=None):
+        """`versions` are the change counters read before `products` and `today_sales_rows` were."""
+        with self.lock:
+            self.products = {}
+            self.low_stock_ids = set()
+            self.total_stock_value = 0.0
+            for p in products:
+                self._add(p)
+            self.today = datetime.now().strftime('%Y-%m-%d')
+            self.today_sales = sum(float(s.get('total_price') or 0) for s in today_sales_rows)
+            self.reconciled_at = time.time()
+            self.versions = dict(versions or {})
+
+    def _add(self, p):
+        entry = {'id': p['id'], 'name': p.get('name'), 'price': float(p.get('price') or 0), 'stock': int(p.get('stock') or 0)}
+        self.products[p['id']] = entry
+        self.total_stock_value += entry['price'] * entry['stock']
+        if entry['stock'] <= LOW_STOCK_THRESHOLD:
+            self.low_stock_ids.add(p['id'])
+
+    def _remove(self, product_id):
+        entry = self.products.pop(product_id, None)
+        if entry:
+            self.total_stock_value -= entry['price'] * entry['stock']
+            self.low_stock_ids.discard(product_id)
+        return entry
+
+    # Deltas are dropped until the first reconcile; the snapshot will include them.
+    def product_added(self, product):
+        with self.lock:
+            if self.reconciled_at and product and product.get('id') is not None:
+                self._remove(product['id'])
+                self._add(product)
+
+    def product_removed(self, product_id):
+        with self.lock:
+            if self.reconciled_at:
+                self._remove(row_key(self.products, product_id))
+
+    def stock_changed(self, product_id, stock=None, delta=0):
+        with self.lock:
+            entry = self.products.get(row_key(self.products, product_id))
+            if not self.reconciled_at or not entry:
+                return
+            new_stock = int(stock) if stock is not None else entry['stock'] + int(delta)
+            self._remove(entry['id'])
+            self._add({**entry, 'stock': new_stock})
+
+    def sale_recorded(self, amount):
+        with self.lock:
+            if self.today == datetime.now().strftime('%Y-%m-%d'):
+                self.today_sales += float(amount or 0)
+
+    def snapshot(self):
+        with self.lock:
+            low_stock = heapq.nsmallest(self.low_stock_limit,
+                                        (self.products[i] for i in self.low_stock_ids),
+                                        key=lambda p: (p['stock'], p['name'] or ''))
+            return {
+                'total_products': len(self.products),
+                'total_stock_value': round(self.total_stock_value, 2),
+                'low_stock_count': len(self.low_stock_ids),
+                'today_sales': round(self.today_sales, 2),
+                'low_stock_items': [dict(p) for p in low_stock],
+            }
+
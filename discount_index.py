@@ -0,0 +1,77 @@
+import heapq
+import threading
+from datetime import date
+
+
+class DiscountError(ValueError):
+    pass
+
+
+class DiscountIndex:
+    """Active discount codes keyed by code, so a code can be checked at the counter without a round trip.
+
+    Built from the reference cache's `discounts` rows and rebuilt whenever they
+    change, including changes made by other workers. Codes are evicted on the
+    day after they expire via a min-heap of expiry dates. The rules mirror the
+    `checkout_cart` SQL function, which stays the authority when a sale commits.
+    """
+
+    def __init__(self, reference, table='discounts'):
+        self.reference = reference
+        self.table = table
+        self.lock = threading.Lock()
+        self.generation = None
+        self.by_code = {}
+        self.expiries = []  # (expiry date, code)
+
+    def _rebuild(self, rows, today):
+        by_code, expiries = {}, []
+        for row in rows:
+            if not row.get('is_active') or not row.get('code'):
+                continue
+            expires = _expiry(row)
+            if expires is not None and expires < today:
+                continue
+            code = row['code'].strip().upper()
+            by_code[code] = row
+            if expires is not None:
+                expiries.append((expires, code))
+        heapq.heapify(expiries)
+        self.by_code, self.expiries = by_code, expiries
+
+    def _evict_expired(self, today):
+        while self.expiries and self.expiries[0][0] < today:
+            expires, code = heapq.heappop(self.expiries)
+            row = self.by_code.get(code)
+            # The code may have been re-created with a later expiry since this entry was pushed
+            if row is not None and _expiry(row) == expires:
+                del self.by_code[code]
+
+    def lookup(self, code, today=None):
+        today = today or date.today()
+        generation = self.reference.generation(self.table)
+        with self.lock:
+            if generation != self.generation:
+                self._rebuild(self.reference.all(self.table), today)
+                self.generation = generation
+            self._evict_expired(today)
+            return self.by_code.get((code or '').strip().upper())
+
+    def quote(self, code, subtotal, today=None):
+        """Discount amount for a cart subtotal; raises DiscountError with the message checkout would give."""
+        code = (code or '').strip().upper()
+        row = self.lookup(code, today)
+        if row is None:
+            raise DiscountError(f'Invalid or expired discount code {code}')
+        min_order = float(row.get('min_order_value') or 0)
+        if subtotal < min_order:
+            raise DiscountError(f"Discount {code} needs a minimum order of {row['min_order_value']}")
+        value = float(row.get('discount_value') or 0)
+        if row.get('discount_type') == 'percentage':
+            return round(subtotal * value / 100, 2)
+        return min(value, subtotal)
+
+
+def _expiry(row):
+    expires = row.get('expires_at')
+    return date.fromisoformat(str(expires)[:10]) if expires else None
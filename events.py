@@ -0,0 +1,186 @@
+"""Broker for live page updates, streamed to browsers as Server-Sent Events.
+
+Mutation routes publish small deltas (a product's new stock, a recorded sale,
+the dashboard totals) and every open page patches itself instead of reloading.
+Each subscriber gets a bounded queue; one that falls too far behind is told to
+reload rather than holding memory for it. Recent events are kept so a client
+reconnecting with Last-Event-ID misses nothing.
+
+On its own the broker only reaches the streams of its own process. With a
+`fanout` (see RealtimeFanout) every event is also relayed to the other server
+workers, which hand it to their streams under the publisher's event id.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class EventBroker:
+    def __init__(self, history=500, queue_size=1000, heartbeat_seconds=15.0, fanout=None):
+        self.heartbeat_seconds = heartbeat_seconds
+        self.queue_size = queue_size
+        self.fanout = fanout
+        self.fanout_pid = None
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.history = deque(maxlen=history)
+        self.last_id = 0
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    def _ensure_fanout(self):
+        # Started per process, after the server has forked its workers
+        if self.fanout is not None and self.fanout_pid != os.getpid():
+            with self.lock:
+                if self.fanout_pid != os.getpid():
+                    self.fanout_pid = os.getpid()
+                    self.fanout.start(self.receive)
+
+    def _next_id(self):
+        # Microseconds, so ids from different workers interleave in publish order
+        self.last_id = max(self.last_id + 1, time.time_ns() // 1000)
+        return self.last_id
+
+    def publish(self, event, data):
+        self._ensure_fanout()
+        with self.lock:
+            message = (self._next_id(), event, data)
+            self._deliver(message)
+            self.published += 1
+        if self.fanout is not None:
+            self.fanout.send(*message)
+        return message[0]
+
+    def receive(self, event_id, event, data):
+        """Deliver an event another worker published."""
+        with self.lock:
+            self.last_id = max(self.last_id, event_id)
+            self._deliver((event_id, event, data))
+            self.received += 1
+
+    def _deliver(self, message):
+        self.history.append(message)
+        for q in list(self.subscribers):
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # A stalled client: stop feeding it and let it resync with a reload
+                self.subscribers.discard(q)
+                self.dropped += 1
+                q.overflowed = True
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def subscribe(self, last_event_id=None):
+        """Yield SSE frames until the client disconnects (the generator is closed)."""
+        self._ensure_fanout()
+        q = queue.Queue(maxsize=self.queue_size)
+        q.overflowed = False
+        with self.lock:
+            backlog = sorted((m for m in self.history if last_event_id is not None and m[0] > last_event_id),
+                             key=lambda m: m[0])
+            if (last_event_id is not None and len(self.history) == self.history.maxlen
+                    and min(m[0] for m in self.history) > last_event_id):
+                backlog = [(self.last_id, 'reset', {})]  # gap larger than the history kept
+            self.subscribers.add(q)
+        try:
+            yield 'retry: 3000\n\n'
+            for message in backlog:
+                yield self.format(*message)
+            while True:
+                try:
+                    message = q.get(timeout=self.heartbeat_seconds)
+                except queue.Empty:
+                    if q.overflowed:
+                        yield self.format(None, 'reset', {})
+                        return
+                    yield ': keep-alive\n\n'
+                    continue
+                yield self.format(*message)
+                if q.overflowed and q.empty():
+                    yield self.format(None, 'reset', {})
+                    return
+        finally:
+            with self.lock:
+                self.subscribers.discard(q)
+
+    @staticmethod
+    def format(event_id, event, data):
+        frame = f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"), default=str)}\n\n'
+        return frame if event_id is None else f'id: {event_id}\n{frame}'
+
+
+class RealtimeFanout:
+    """Relays broker events between server workers over a Supabase Realtime broadcast channel.
+
+    The websocket runs on an asyncio loop in a daemon thread; `send` only
+    schedules the broadcast, so publishing never waits on the network. A
+    worker ignores its own broadcasts, which it has already delivered. Until
+    the channel is joined (retried every `retry_seconds`) events stay local.
+    """
+
+    def __init__(self, url, key, topic='live-updates', event='live', retry_seconds=30.0):
+        self.url = f"{url.rstrip('/')}/realtime/v1"
+        self.key = key
+        self.topic = topic
+        self.event = event
+        self.retry_seconds = retry_seconds
+        self.origin = None
+        self.loop = None
+        self.channel = None
+        self.receive = None
+
+    def start(self, receive):
+        self.receive = receive
+        self.origin = uuid.uuid4().hex  # a forked worker must not share its parent's
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name='events-fanout', daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._join(), self.loop)
+
+    async def _join(self):
+        # Imported here: only servers running more than one worker need it
+        from realtime import AsyncRealtimeClient
+        while self.channel is None:
+            try:
+                client = AsyncRealtimeClient(self.url, self.key)
+                channel = client.channel(self.topic)
+                channel.on_broadcast(self.event, self._on_broadcast)
+                await channel.subscribe()
+                self.channel = channel  # the client reconnects and rejoins by itself from here on
+            except Exception as e:
+                logger.warning('Could not join the live events channel, retrying in %ss: %r', self.retry_seconds, e)
+                await asyncio.sleep(self.retry_seconds)
+
+    def _on_broadcast(self, payload):
+        message = payload.get('payload') or {}
+        if message.get('origin') == self.origin:
+            return
+        try:
+            self.receive(int(message['id']), message['event'], message.get('data'))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning('Ignoring malformed live event %r: %r', message, e)
+
+    def send(self, event_id, event, data):
+        # Round-trip through JSON now: the payload must not change under the loop thread
+        message = {'origin': self.origin, 'id': event_id, 'event': event,
+                   'data': json.loads(json.dumps(data, default=str))}
+        asyncio.run_coroutine_threadsafe(self._send(message), self.loop)
+
+    async def _send(self, message):
+        if self.channel is None:
+            return
+        try:
+            await self.channel.send_broadcast(self.event, message)
+        except Exception as e:
+            logger.warning('Could not relay live event %s to the other workers: %r', message['event'], e)
@@ -0,0 +1,519 @@
+"""In-memory stand-in for the Supabase client, for benchmarks and local runs.
+
+Implements the slice of the postgrest/auth API this app uses: table queries
+with the usual filters (including `or_` expressions), ordering, limits,
+`single()`, writes, and Python versions of the SQL functions under
+supabase/migrations. An optional per-call latency models the network round
+trip to a hosted project, and an optional `max_rows` PostgREST's cap on the
+rows one select returns.
+"""
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+PRIMARY_KEYS = {'cache_versions': 'name'}
+# Rows the table_versions migration creates up front
+STAMPED_TABLES = ('products', 'sales', 'customers', 'suppliers', 'discounts', 'purchase_orders', 'returns', 'expenses')
+
+
+class FakeAPIError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _coerce(row_value, value):
+    # PostgREST filter values arrive as strings; compare them as the column's type
+    if isinstance(value, str):
+        if isinstance(row_value, bool):
+            return value.lower() == 'true'
+        if isinstance(row_value, (int, float)):
+            try:
+                return float(value)
+            except ValueError:
+                return value
+    return value
+
+
+def _compare(op, row_value, value):
+    if op == 'is':
+        return row_value is None if str(value).lower() == 'null' else row_value == _coerce(row_value, value)
+    if op == 'in':
+        return row_value in [_coerce(row_value, v) for v in value]
+    if row_value is None:
+        return False
+    value = _coerce(row_value, value)
+    if isinstance(row_value, (int, float)) and not isinstance(value, (int, float)):
+        row_value = str(row_value)
+    if op in ('like', 'ilike'):
+        pattern = '^' + '.*'.join(re.escape(part) for part in str(value).replace('%', '*').split('*')) + '$'
+        return re.match(pattern, str(row_value), re.IGNORECASE if op == 'ilike' else 0) is not None
+    try:
+        return {'eq': row_value == value, 'neq': row_value != value, 'gt': row_value > value,
+                'gte': row_value >= value, 'lt': row_value < value, 'lte': row_value <= value}[op]
+    except TypeError:
+        return False
+
+
+def _split_top_level(expr):
+    parts, depth, quoted, current = [], 0, False, ''
+    i = 0
+    while i < len(expr):
+        ch = expr[i]
+        if ch == '\\' and quoted:
+            current += expr[i:i + 2]
+            i += 2
+            continue
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == '(':
+            depth += 1
+        elif not quoted and ch == ')':
+            depth -= 1
+        if ch == ',' and depth == 0 and not quoted:
+            parts.append(current)
+            current = ''
+        else:
+            current += ch
+        i += 1
+    parts.append(current)
+    return [p for p in parts if p]
+
+
+def _parse_logic(expr):
+    """Parse a PostgREST `or`/`and` body into a predicate over a row."""
+    preds = []
+    for part in _split_top_level(expr):
+        for kind in ('and', 'or'):
+            if part.startswith(kind + '('):
+                inner = _parse_logic(part[len(kind) + 1:-1])
+                preds.append(inner['and'] if kind == 'and' else inner['or'])
+                break
+        else:
+            column, op, value = part.split('.', 2)
+            negate = op == 'not'
+            if negate:
+                op, value = value.split('.', 1)
+            if value.startswith('"') and value.endswith('"'):
+                value = re.sub(r'\\(.)', r'\1', value[1:-1])
+            preds.append(lambda row, c=column, o=op, v=value, n=negate: _compare(o, row.get(c), v) != n)
+    return {'and': lambda row: all(p(row) for p in preds),
+            'or': lambda row: any(p(row) for p in preds)}
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db, self.table_name = db, table
+        self.operation, self.columns, self.payload = 'select', None, None
+        self.filters, self.orders = [], []
+        self.limit_n, self.offset_n, self.single_row, self.count_mode = None, 0, False, None
+        self.on_conflict = None
+
+    # -- operations
+    def select(self, columns='*', count=None):
+        self.operation, self.count_mode = 'select', count
+        self.columns = None if columns.strip() == '*' else [c.strip() for c in columns.split(',')]
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.operation, self.payload = 'insert', rows
+        return self
+
+    def upsert(self, rows, on_conflict=None, **kwargs):
+        self.operation, self.payload, self.on_conflict = 'upsert', rows, on_conflict
+        return self
+
+    def update(self, values, **kwargs):
+        self.operation, self.payload = 'update', values
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = 'delete'
+        return self
+
+    # -- filters
+    def _filter(self, op, column, value):
+        self.filters.append(lambda row: _compare(op, row.get(column), value))
+        return self
+
+    def eq(self, column, value): return self._filter('eq', column, value)
+    def neq(self, column, value): return self._filter('neq', column, value)
+    def gt(self, column, value): return self._filter('gt', column, value)
+    def gte(self, column, value): return self._filter('gte', column, value)
+    def lt(self, column, value): return self._filter('lt', column, value)
+    def lte(self, column, value): return self._filter('lte', column, value)
+    def like(self, column, value): return self._filter('like', column, value)
+    def ilike(self, column, value): return self._filter('ilike', column, value)
+    def is_(self, column, value): return self._filter('is', column, value)
+    def in_(self, column, values): return self._filter('in', column, list(values))
+
+    def or_(self, expr, **kwargs):
+        self.filters.append(_parse_logic(expr)['or'])
+        return self
+
+    def order(self, column, desc=False, **kwargs):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n, **kwargs):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end, **kwargs):
+        self.offset_n, self.limit_n = start, end - start + 1
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    maybe_single = single
+
+    # -- execution
+    def execute(self):
+        self.db.round_trip()
+        with self.db.lock:
+            data, count = getattr(self, '_' + self.operation)()
+        if self.single_row:
+            if len(data) != 1:
+                raise FakeAPIError(f'JSON object requested, multiple (or no) rows returned ({len(data)})')
+            data = data[0]
+        return SimpleNamespace(data=data, count=count)
+
+    def _matching(self):
+        return [row for row in self.db.tables[self.table_name].values() if all(f(row) for f in self.filters)]
+
+    def _select(self):
+        rows = self._matching()
+        count = len(rows) if self.count_mode else None
+        for column, desc in reversed(self.orders):
+            present = [r for r in rows if r.get(column) is not None]
+            missing = [r for r in rows if r.get(column) is None]
+            # Postgres defaults: nulls last ascending, first descending
+            present = sorted(present, key=lambda r: r[column], reverse=desc)
+            rows = missing + present if desc else present + missing
+        rows = rows[self.offset_n:]
+        if self.limit_n is not None:
+            rows = rows[:self.limit_n]
+        if self.db.max_rows is not None:
+            rows = rows[:self.db.max_rows]  # PostgREST's db-max-rows cap
+        if self.columns:
+            rows = [{c: r.get(c) for c in self.columns} for r in rows]
+        return [dict(r) for r in rows], count
+
+    def _insert(self):
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        return [self.db.insert_row(self.table_name, row) for row in rows], None
+
+    def _upsert(self):
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        key = self.on_conflict or PRIMARY_KEYS.get(self.table_name, 'id')
+        table, out = self.db.tables[self.table_name], []
+        for row in rows:
+            if row.get(key) in table:
+                table[row[key]].update(row)
+                out.append(dict(table[row[key]]))
+            else:
+                out.append(self.db.insert_row(self.table_name, row))
+        return out, None
+
+    def _update(self):
+        rows = self._matching()
+        for row in rows:
+            old = dict(row)
+            row.update(self.payload)
+            self.db.row_changed(self.table_name, old, row)
+        return [dict(r) for r in rows], None
+
+    def _delete(self):
+        rows = self._matching()
+        key = PRIMARY_KEYS.get(self.table_name, 'id')
+        for row in rows:
+            self.db.tables[self.table_name].pop(row[key], None)
+            self.db.row_changed(self.table_name, row, None)
+        return [dict(r) for r in rows], None
+
+
+class FakeRpc:
+    def __init__(self, db, fn, params):
+        self.db, self.fn, self.params = db, fn, params or {}
+
+    def execute(self):
+        self.db.round_trip()
+        handler = self.db.rpcs.get(self.fn)
+        if handler is None:
+            raise FakeAPIError(f'Could not find the function public.{self.fn}')
+        with self.db.lock:
+            return SimpleNamespace(data=handler(self.db, **self.params), count=None)
+
+
+class FakeAuth:
+    def __init__(self, db):
+        self.db = db
+
+    def sign_in_with_password(self, credentials):
+        self.db.round_trip()
+        for user in self.db.tables['users'].values():
+            if user.get('email') == credentials.get('email') and user.get('password') == credentials.get('password'):
+                return SimpleNamespace(user=SimpleNamespace(id=user['id'], email=user['email']))
+        raise FakeAPIError('Invalid login credentials')
+
+    def sign_out(self):
+        return None
+
+
+def _checkout_cart(db, p_items, p_customer_id=None, p_discount_code=None, p_payment_method='Cash',
+                   p_amount_paid=None):
+    products = db.tables['products']
+    cart = defaultdict(int)
+    for item in p_items or []:
+        cart[int(item['product_id'])] += int(item['quantity'])
+    if not cart:
+        raise FakeAPIError('Cart is empty')
+    for product_id, qty in cart.items():
+        product = products.get(product_id)
+        if qty <= 0:
+            raise FakeAPIError(f'Invalid quantity for product {product_id}')
+        if not product or product['stock'] < qty:
+            raise FakeAPIError(f'Insufficient stock for product {product_id}')
+
+    subtotal = sum(products[pid]['price'] * qty for pid, qty in cart.items())
+    discount, code = 0, (p_discount_code or '').upper() or None
+    if code:
+        match = next((d for d in db.tables['discounts'].values() if d.get('code') == code and d.get('is_active')
+                      and (not d.get('expires_at') or d['expires_at'][:10] >= _now()[:10])), None)
+        if not match:
+            raise FakeAPIError(f'Invalid or expired discount code {code}')
+        if subtotal < float(match.get('min_order_value') or 0):
+            raise FakeAPIError(f"Discount {code} needs a minimum order of {match['min_order_value']}")
+        discount = (round(subtotal * match['discount_value'] / 100, 2) if match['discount_type'] == 'percentage'
+                    else min(match['discount_value'], subtotal))
+
+    order_id, lines, sale_ids = str(uuid.uuid4()), [], []
+    for product_id in sorted(cart):
+        product, qty = products[product_id], cart[product_id]
+        _apply_movement(db, product_id, -qty, 'sale', f'order:{order_id}')
+        lines.append({'product_id': product_id, 'quantity': qty, 'total_price': product['price'] * qty,
+                      'stock': product['stock']})
+        sale = db.insert_row('sales', {
+            'order_id': order_id, 'product_id': product_id, 'quantity': qty,
+            'total_price': product['price'] * qty, 'customer_id': p_customer_id, 'discount': discount,
+            'discount_code': code, 'amount_paid': p_amount_paid, 'payment_method': p_payment_method or 'Cash'})
+        sale_ids.append(sale['id'])
+    return {'order_id': order_id, 'subtotal': subtotal, 'discount': discount, 'sale_ids': sale_ids, 'lines': lines}
+
+
+def _bulk_adjust_stock(db, p_changes):
+    products, results = db.tables['products'], []
+    for change in p_changes:
+        product_id = int(change['id'])
+        product = products.get(product_id)
+        if product is None:
+            results.append({'id': product_id, 'success': False, 'stock': None, 'error': 'Product not found'})
+            continue
+        stock = change['stock'] if change.get('stock') is not None else product['stock'] + int(change.get('delta') or 0)
+        if stock < 0:
+            results.append({'id': product_id, 'success': False, 'stock': None, 'error': 'Stock cannot go below zero'})
+            continue
+        if stock != product['stock']:
+            _apply_movement(db, product_id, stock - product['stock'], 'adjust')
+        results.append({'id': product_id, 'success': True, 'stock': stock, 'error': None})
+    return results
+
+
+def _bump_cache_versions(db, p_names):
+    versions, out = db.tables['cache_versions'], []
+    for name in sorted(set(p_names)):
+        row = versions.setdefault(name, {'name': name, 'version': 0})
+        row.update(version=row['version'] + 1, updated_at=_now())
+        out.append({'name': name, 'version': row['version']})
+    return out
+
+
+def _apply_movement(db, product_id, delta, reason, ref_id=None):
+    product = db.tables['products'].get(int(product_id))
+    if product is None:
+        raise FakeAPIError(f'Product not found: {product_id}')
+    if product['stock'] + delta < 0:
+        raise FakeAPIError(f'Insufficient stock for product {product_id}')
+    product['stock'] += delta
+    db.insert_row('stock_movements', {'product_id': product['id'], 'delta': delta, 'reason': reason, 'ref_id': ref_id})
+    return product['stock']
+
+
+def _transition(db, table, row_id, status, moving_status, reason):
+    row = db.tables[table].get(int(row_id))
+    if row is None:
+        raise FakeAPIError(f'{table} row not found: {row_id}')
+    if row.get('status') == moving_status and status != moving_status:
+        raise FakeAPIError(f'{table} row {row_id} was already {moving_status.lower()}')
+    stock = None
+    if row.get('status') != status:
+        if status == moving_status:
+            stock = _apply_movement(db, row['product_id'], int(row['quantity']), reason, f'{table}:{row_id}')
+        old = dict(row)
+        row['status'] = status
+        db.row_changed(table, old, row)
+    return {'id': row['id'], 'status': status, 'product_id': row['product_id'], 'stock': stock}
+
+
+def _transition_purchase_order(db, p_order_id, p_status):
+    return _transition(db, 'purchase_orders', p_order_id, p_status, 'Received', 'receipt')
+
+
+def _transition_return(db, p_return_id, p_status):
+    return _transition(db, 'returns', p_return_id, p_status, 'Approved', 'return')
+
+
+def _snapshot_stock(db):
+    last_id = max(db.tables['stock_movements'], default=0)
+    taken_at = _now()
+    for product in db.tables['products'].values():
+        db.insert_row('stock_snapshots', {'id': None, 'product_id': product['id'], 'taken_at': taken_at,
+                                          'stock': product['stock'], 'last_movement_id': last_id})
+    return len(db.tables['products'])
+
+
+def _stock_as_of(db, p_at, p_product_id=None):
+    p_at = str(p_at)
+    snapshots = defaultdict(list)
+    for snap in db.tables['stock_snapshots'].values():
+        if snap['taken_at'] <= p_at:
+            snapshots[snap['product_id']].append(snap)
+    rows = []
+    for product_id in db.tables['products']:
+        if p_product_id is not None and product_id != int(p_product_id):
+            continue
+        snap = max(snapshots[product_id], key=lambda s: s['taken_at'], default=None)
+        base, after = (snap['stock'], snap['last_movement_id']) if snap else (0, 0)
+        rows.append({'product_id': product_id, 'stock': base + sum(
+            m['delta'] for m in db.tables['stock_movements'].values()
+            if m['product_id'] == product_id and m['id'] > after and m['created_at'] <= p_at)})
+    return rows
+
+
+class FakeSupabase:
+    def __init__(self, latency=0.0, max_rows=None):
+        self.latency = latency
+        self.max_rows = max_rows
+        self.lock = threading.RLock()
+        self.tables = defaultdict(dict)
+        self.next_ids = defaultdict(int)
+        self.auth = FakeAuth(self)
+        self.rpcs = {
+            'checkout_cart': _checkout_cart,
+            'bulk_adjust_stock': _bulk_adjust_stock,
+            'transition_purchase_order': _transition_purchase_order,
+            'transition_return': _transition_return,
+            'snapshot_stock': _snapshot_stock,
+            'stock_as_of': _stock_as_of,
+            'bump_cache_versions': _bump_cache_versions,
+        }
+        for name in STAMPED_TABLES:
+            self.tables['cache_versions'][name] = {'name': name, 'version': 0, 'updated_at': _now()}
+
+    def round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, fn, params=None, **kwargs):
+        return FakeRpc(self, fn, params)
+
+    def insert_row(self, table, row):
+        key = PRIMARY_KEYS.get(table, 'id')
+        row = dict(row)
+        if key == 'id' and row.get('id') is None:
+            self.next_ids[table] += 1
+            row['id'] = self.next_ids[table]
+        elif key == 'id' and isinstance(row['id'], int):
+            self.next_ids[table] = max(self.next_ids[table], row['id'])
+        row.setdefault('created_at', _now())
+        self.tables[table][row[key]] = row
+        if table == 'products' and row.get('stock'):
+            # Mirrors the products_opening_stock trigger
+            self.insert_row('stock_movements', {'product_id': row['id'], 'delta': row['stock'], 'reason': 'opening'})
+        self.row_changed(table, None, row)
+        return dict(row)
+
+    def row_changed(self, table, old, new):
+        """Mirrors the expenses_rollup and returns_rollup triggers."""
+        for row, sign in ((old, -1), (new, 1)):
+            if not row:
+                continue
+            if table == 'expenses':
+                month = (row.get('expense_date') or row['created_at'])[:7] + '-01'
+                self._bump_rollup('expenses', month, row.get('category') or 'General',
+                                  sign * float(row.get('amount') or 0), sign)
+            elif table == 'returns' and row.get('status') == 'Approved':
+                self._bump_rollup('refunds', row['created_at'][:7] + '-01', 'Refunds',
+                                  sign * float(row.get('refund_amount') or 0), sign)
+
+    def _bump_rollup(self, source, month, category, amount, entries):
+        # Keyed by the table's composite primary key; rollups are only ever read by the app
+        row = self.tables['monthly_rollups'].setdefault((source, month, category), {
+            'source': source, 'month': month, 'category': category, 'total': 0.0, 'entries': 0})
+        row['total'] = round(row['total'] + amount, 2)
+        row['entries'] += entries
+
+    def seed(self, products=500, sales=20000, customers=500, suppliers=20, expenses=2000,
+             purchase_orders=1000, returns=500, days=365, seed=42):
+        """Fill the tables with a reproducible synthetic store history."""
+        rng = random.Random(seed)
+        categories = ['Fruits', 'Vegetables', 'Dairy', 'Snacks', 'Grains', 'Beverages']
+        now = datetime.now()
+
+        def stamp():
+            return (now - timedelta(seconds=rng.randint(0, days * 86400))).isoformat(timespec='seconds')
+
+        with self.lock:
+            self.insert_row('users', {'id': str(uuid.uuid4()), 'email': 'admin@example.com',
+                                      'password': 'admin', 'role': 'admin'})
+            for i in range(suppliers):
+                self.insert_row('suppliers', {'name': f'Supplier {i}', 'phone': f'98{i:08d}',
+                                              'product_type': rng.choice(categories), 'created_at': stamp()})
+            for i in range(products):
+                self.insert_row('products', {'name': f'Product {i:05d}', 'price': round(rng.uniform(5, 500), 2),
+                                             'category': rng.choice(categories), 'stock': rng.randint(0, 500),
+                                             'unit': rng.choice(['pcs', 'kg', 'l']), 'created_at': stamp()})
+            for i in range(customers):
+                self.insert_row('customers', {'name': f'Customer {i:05d}', 'phone': f'99{i:08d}',
+                                              'email': f'customer{i}@example.com', 'created_at': stamp()})
+            product_rows = list(self.tables['products'].values())
+            for _ in range(sales):
+                product, qty = rng.choice(product_rows), rng.randint(1, 5)
+                self.insert_row('sales', {'product_id': product['id'], 'quantity': qty,
+                                          'total_price': round(product['price'] * qty, 2), 'created_at': stamp()})
+            for _ in range(expenses):
+                created = stamp()
+                self.insert_row('expenses', {'title': 'Expense', 'amount': round(rng.uniform(50, 5000), 2),
+                                             'category': rng.choice(['Rent', 'Utilities', 'Salary', 'General']),
+                                             'expense_date': created[:10], 'created_at': created})
+            supplier_ids = list(self.tables['suppliers'])
+            for _ in range(purchase_orders):
+                created = stamp()
+                self.insert_row('purchase_orders', {
+                    'product_id': rng.choice(product_rows)['id'], 'supplier_id': rng.choice(supplier_ids),
+                    'quantity': rng.randint(10, 200), 'unit_cost': round(rng.uniform(3, 400), 2),
+                    'status': rng.choice(['Pending', 'Received', 'Cancelled']), 'order_date': created[:10],
+                    'created_at': created})
+            sale_ids = list(self.tables['sales'])
+            for _ in range(returns):
+                sale = self.tables['sales'][rng.choice(sale_ids)]
+                self.insert_row('returns', {'sale_id': sale['id'], 'product_id': sale['product_id'], 'quantity': 1,
+                                            'refund_amount': round(sale['total_price'] / sale['quantity'], 2),
+                                            'status': rng.choice(['Pending', 'Approved', 'Rejected']),
+                                            'created_at': stamp()})
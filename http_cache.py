@@ -0,0 +1,242 @@
+"""HTTP caching for the app: conditional page GETs, response compression and fingerprinted assets.
+
+Pages are revalidated against the `cache_versions` counters of the tables they
+read (the app bumps them once a write request is done, see `written_tables`), so an unchanged page
+costs one cached version lookup and an empty 304 instead of its queries and
+template. Everything else that is sent is compressed with zstd or gzip, and
+static files linked through `asset_url` carry a content hash so browsers can
+keep them for a year.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timezone
+from functools import wraps
+
+from cachetools import LRUCache
+from flask import g, has_request_context, make_response, request, session, url_for
+from flask_login import current_user
+
+try:
+    import zstandard
+except ImportError:  # gzip only
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+MIN_COMPRESS_BYTES = 1024
+ASSET_MAX_AGE = 365 * 24 * 3600
+WRITE_OPERATIONS = ('insert', 'update', 'upsert', 'delete')
+
+
+class TableVersions:
+    """Per-table change stamps from `cache_versions`, re-read at most every `check_seconds`.
+
+    Writes made by this worker call `expire()`, so a page reloaded straight
+    after its own POST is never answered from the old stamps.
+    """
+
+    def __init__(self, client, check_seconds=2, table='cache_versions'):
+        self.client = client
+        self.check_seconds = check_seconds
+        self.table = table
+        self.lock = threading.Lock()
+        self.stamps = None
+        self.read_at = 0.0
+
+    def expire(self):
+        with self.lock:
+            self.read_at = 0.0
+
+    def get(self):
+        """{table: (version, updated_at)}, or None when the version table can't be read."""
+        with self.lock:
+            if self.stamps is not None and time.time() - self.read_at < self.check_seconds:
+                return self.stamps
+        try:
+            rows = self.client.table(self.table).select('name, version, updated_at').execute().data or []
+        except Exception as e:
+            logger.debug('Reading %s failed: %r', self.table, e)
+            return None
+        stamps = {row['name']: (row.get('version'), row.get('updated_at')) for row in rows}
+        with self.lock:
+            self.stamps, self.read_at = stamps, time.time()
+        return stamps
+
+
+def written_tables(breakdown, rpc_writes):
+    """Tables a request wrote, from its per-query breakdown; `rpc_writes` maps SQL functions to the tables they change.
+
+    Stamps are bumped from here, after the write has committed, instead of by
+    triggers: a counter row updated inside every writing transaction would be
+    locked until its commit and queue each checkout behind the last.
+    """
+    tables = set()
+    for table, operation, _ in breakdown:
+        if operation in WRITE_OPERATIONS:
+            tables.add(table)
+        elif operation == 'rpc':
+            tables.update(rpc_writes.get(table.partition(':')[2], ()))
+    return tables
+
+
+def mark_degraded():
+    """Keep the current response out of conditional caching: part of it was rendered from fallbacks."""
+    if has_request_context():
+        g.no_etag = True
+
+
+def template_stamp(folder):
+    """Changes whenever a template does, and is the same in every worker."""
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(folder)):
+        stat = os.stat(os.path.join(folder, name))
+        digest.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()[:12]
+
+
+def _parse_stamp(value):
+    if not value:
+        return None
+    stamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    return stamp if stamp.tzinfo else stamp.replace(tzinfo=timezone.utc)
+
+
+def conditional(versions, tables, build=''):
+    """Answer GETs of a view with 304 while none of `tables` has changed.
+
+    `tables` is a tuple of table names, or a callable taking the view's keyword
+    arguments and returning one. The ETag also covers the URL, the user and
+    the date, because pages filter on "today".
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # A pending flash message has to be rendered, not revalidated away
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            names = tables(**kwargs) if callable(tables) else tables
+            stamps = versions.get()
+            if stamps is None:
+                return view(*args, **kwargs)
+            found = [stamps.get(name, (None, None)) for name in names]
+            key = '|'.join([request.full_path, str(getattr(current_user, 'id', '')), date.today().isoformat(), build]
+                           + [str(version) for version, _ in found])
+            etag = hashlib.sha1(key.encode()).hexdigest()
+            modified = [stamp for stamp in (_parse_stamp(updated) for _, updated in found) if stamp]
+            last_modified = max(modified) if len(modified) == len(names) else None
+
+            if request.if_none_match:
+                fresh = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                fresh = bool(last_modified and since and last_modified.replace(microsecond=0) <= since)
+            response = make_response('' if fresh else view(*args, **kwargs))
+            if fresh:
+                response.status_code = 304
+            elif response.status_code != 200 or g.get('no_etag'):
+                # An ETag on a fallback render would keep serving it after the data is back
+                return response
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+class AssetFingerprints:
+    """Content hashes for files under static/, recomputed when a file changes on disk."""
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.lock = threading.Lock()
+        self.hashes = {}  # filename -> (mtime_ns, hash)
+
+    def fingerprint(self, filename):
+        path = os.path.join(self.static_folder, filename)
+        mtime = os.stat(path).st_mtime_ns
+        with self.lock:
+            cached = self.hashes.get(filename)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        with self.lock:
+            self.hashes[filename] = (mtime, digest)
+        return digest
+
+    def url(self, filename):
+        try:
+            return url_for('static', filename=filename, v=self.fingerprint(filename))
+        except OSError:
+            return url_for('static', filename=filename)
+
+
+def cache_static(response):
+    """Long-lived caching for fingerprinted asset URLs; the fingerprint changes with the file."""
+    if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 304):
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+
+class Compressor:
+    """zstd or gzip for text responses, whichever the client accepts (zstd first).
+
+    Static files are compressed once per (file, encoding) and the bytes kept in
+    a small LRU, since the same stylesheet is sent to every page load.
+    """
+
+    def __init__(self, level_gzip=6, level_zstd=3, static_cache_size=64):
+        self.level_gzip = level_gzip
+        self.level_zstd = level_zstd
+        self.static_cache = LRUCache(maxsize=static_cache_size)
+        self.lock = threading.Lock()
+
+    def encoding_for(self, accept_encodings):
+        if zstandard is not None and accept_encodings['zstd']:
+            return 'zstd'
+        if accept_encodings['gzip']:
+            return 'gzip'
+        return None
+
+    def compress(self, data, encoding):
+        if encoding == 'zstd':
+            return zstandard.ZstdCompressor(level=self.level_zstd).compress(data)
+        return gzip.compress(data, compresslevel=self.level_gzip)
+
+    def __call__(self, response):
+        response.vary.add('Accept-Encoding')
+        encoding = self.encoding_for(request.accept_encodings)
+        # Generators (live events, CSV exports) go out as they are produced; files from send_file are read
+        streamed = response.is_streamed and not response.direct_passthrough
+        if (encoding is None or streamed or response.status_code != 200 or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+            return response
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < MIN_COMPRESS_BYTES:
+            return response
+        etag, weak = response.get_etag()
+        if request.endpoint == 'static' and etag:
+            key = (request.path, etag, encoding)
+            with self.lock:
+                body = self.static_cache.get(key)
+            if body is None:
+                body = self.compress(data, encoding)
+                with self.lock:
+                    self.static_cache[key] = body
+        else:
+            body = self.compress(data, encoding)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            # Same content, different bytes: only a weak validator still holds
+            response.set_etag(etag, weak=True)
+        return response
+
@@ -0,0 +1,160 @@
+import threading
+import time
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Queries issued while serving the current request; QueryBatch copies the context into its workers
+current_queries = ContextVar('current_queries', default=None)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help_text, tuple(labelnames), buckets
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, value, *labels):
+        with self.lock:
+            counts = self.series.get(labels)
+            if counts is None:
+                counts = self.series[labels] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts['buckets'][i] += 1
+            counts['sum'] += value
+            counts['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for labels, counts in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, counts['buckets']):
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames + ("le",), labels + (bound,))} {count}')
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames + ("le",), labels + ("+Inf",))} {counts["count"]}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {counts["sum"]:.6f}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {counts["count"]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for labels, value in sorted(self.series.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register a callable returning exposition lines for values owned elsewhere."""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for fn in self.collectors:
+            lines += fn()
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+request_latency = registry.histogram('http_request_duration_seconds', 'Time spent serving a request.',
+                                     ('endpoint', 'method', 'status'))
+query_latency = registry.histogram('supabase_query_duration_seconds', 'Latency of Supabase calls.',
+                                   ('table', 'operation'))
+query_errors = registry.counter('supabase_query_errors_total', 'Supabase calls that raised.',
+                                ('table', 'operation'))
+
+QUERY_OPERATIONS = ('select', 'insert', 'update', 'upsert', 'delete')
+
+
+class _QueryProxy:
+    """Wraps a postgrest request builder so `execute()` is timed per table and operation."""
+
+    def __init__(self, builder, table, operation='select'):
+        self._builder, self._table, self._operation = builder, table, operation
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if name == 'execute':
+            return self._execute
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if not hasattr(result, 'execute'):
+                return result
+            operation = name if name in QUERY_OPERATIONS else self._operation
+            return _QueryProxy(result, self._table, operation)
+        return chained
+
+    def _execute(self, *args, **kwargs):
+        return timed_call(self._table, self._operation, self._builder.execute, *args, **kwargs)
+
+
+def timed_call(table, operation, fn, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        query_errors.inc(table, operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        query_latency.observe(elapsed, table, operation)
+        breakdown = current_queries.get()
+        if breakdown is not None:
+            breakdown.append((table, operation, elapsed))
+
+
+class InstrumentedClient:
+    """Drop-in wrapper around the Supabase client that records every table/RPC call."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name):
+        return _QueryProxy(self._client.table(name), name)
+
+    from_ = table
+
+    def rpc(self, fn, params=None, *args, **kwargs):
+        return _QueryProxy(self._client.rpc(fn, params or {}, *args, **kwargs), f'rpc:{fn}', 'rpc')
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
@@ -0,0 +1,42 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBatch:
+    """Runs a view's independent Supabase reads concurrently on a shared, bounded pool.
+
+    Each query is isolated: if it raises or misses the deadline the caller gets
+    its default instead, and the rest of the batch is unaffected; `on_fallback`
+    is then called with the query's name. The callables
+    run outside the request context, so resolve `request.args` etc. before
+    building them.
+    """
+
+    def __init__(self, max_workers=8, timeout=10.0, on_fallback=None):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='supabase-query')
+        self.timeout = timeout
+        self.on_fallback = on_fallback
+
+    def run(self, queries, defaults=None, timeout=None):
+        defaults = defaults or {}
+        timeout = self.timeout if timeout is None else timeout
+        # Each worker runs in a copy of the caller's context so per-request instrumentation follows it
+        futures = {name: self.pool.submit(contextvars.copy_context().run, fn) for name, fn in queries.items()}
+        deadline = time.monotonic() + timeout
+        wait(futures.values(), timeout=timeout)
+
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                future.cancel()
+                logger.warning('Query %r failed: %r', name, e)
+                results[name] = defaults.get(name)
+                if self.on_fallback is not None:
+                    self.on_fallback(name)
+        return results
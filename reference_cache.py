@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+
+from bulk_io import iter_table
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceCache:
+    """In-process id -> row cache for small, hot reference tables.
+
+    Tables are reloaded every `refresh_seconds`. Mutation routes patch the local
+    copy immediately and mark the table; `flush()` then increments its stamp in
+    the shared `cache_versions` table (see `bump_cache_versions`). A worker
+    whose increment doesn't land on the next number it expected knows someone
+    else wrote in between and reloads. Other workers compare stamps at most
+    every `version_check_seconds` and reload when theirs is out of date.
+    Network round trips never happen under `lock`, so readers keep being
+    served from the current copy while a table reloads.
+    """
+
+    def __init__(self, client, tables, refresh_seconds=300, version_check_seconds=5, version_table='cache_versions'):
+        self.client = client
+        self.tables = tables
+        self.refresh_seconds = refresh_seconds
+        self.version_check_seconds = version_check_seconds
+        self.version_table = version_table
+        self.lock = threading.RLock()
+        self.load_locks = {table: threading.Lock() for table in tables}
+        self.data = {}
+        self.loaded_at = {}
+        self.checked_at = {}
+        self.versions = {}
+        self.pending = set()  # tables changed locally whose stamp hasn't been bumped yet
+        self.generations = {}  # table -> counter bumped on every local change, for derived indexes
+        self.listeners = {}  # table -> callbacks(event, payload) for indexes maintained row by row
+
+    def _remote_version(self, table):
+        rows = (self.client.table(self.version_table).select('version')
+                .eq('name', table).limit(1).execute().data or [])
+        return rows[0]['version'] if rows else None
+
+    def _check_version(self, table):
+        try:
+            return self._remote_version(table)
+        except Exception as e:
+            # No version table: fall back to the refresh interval alone
+            logger.debug('Version check for %s failed: %r', table, e)
+            return None
+
+    def _load(self, table, seen):
+        with self.load_locks[table]:
+            with self.lock:
+                if self.loaded_at.get(table) != seen:
+                    return  # another thread reloaded it while this one waited
+                generation = self.generations.get(table)
+            # Read the stamp before the rows so a bump made during the fetch is never missed
+            version = self._check_version(table)
+            # Paged: one select would stop at PostgREST's max-rows
+            rows = list(iter_table(self.client, table, [c.strip() for c in self.tables[table].split(',')]))
+            with self.lock:
+                self.data[table] = {row['id']: row for row in rows}
+                self.versions[table] = version
+                # A local change made during the fetch may be missing from it: reload on the next read
+                fresh = self.generations.get(table) == generation
+                self._changed(table, 'load', rows)
+                self.loaded_at[table] = time.time() if fresh else 0
+                self.checked_at[table] = time.time()
+
+    def _ensure_fresh(self, table):
+        now = time.time()
+        with self.lock:
+            loaded = table in self.data
+            seen = self.loaded_at.get(table)
+            if loaded and now - seen <= self.refresh_seconds:
+                if now - self.checked_at.get(table, 0) < self.version_check_seconds:
+                    return
+                self.checked_at[table] = now  # one thread checks; the rest keep reading the current copy
+                known = self.versions.get(table)
+            elif loaded and self.load_locks[table].locked():
+                return  # being reloaded: serve the current copy meanwhile
+            else:
+                known = None
+        if loaded and seen and now - seen <= self.refresh_seconds:
+            remote = self._check_version(table)
+            if remote is None or remote == known:
+                return
+        self._load(table, seen)
+
+    def _rows(self, table):
+        while True:
+            self._ensure_fresh(table)
+            with self.lock:
+                rows = self.data.get(table)
+                if rows is not None:  # else invalidated in between: load again
+                    return rows
+
+    def _changed(self, table, event, payload):
+        self.generations[table] = self.generations.get(table, 0) + 1
+        for callback in self.listeners.get(table, ()):
+            callback(event, payload)
+
+    def subscribe(self, table, callback):
+        """Call `callback('load', rows)`, `('upsert', row)` or `('remove', id)` as the cached table changes."""
+        with self.lock:
+            self.listeners.setdefault(table, []).append(callback)
+            if table in self.data:
+                callback('load', list(self.data[table].values()))
+
+    def generation(self, table):
+        """A number that changes whenever the table's cached rows do."""
+        self._rows(table)
+        with self.lock:
+            return self.generations[table]
+
+    def all(self, table):
+        rows = self._rows(table)
+        with self.lock:
+            return list(rows.values())
+
+    def map(self, table, field='name'):
+        rows = self._rows(table)
+        with self.lock:
+            return {row_id: row.get(field) for row_id, row in rows.items()}
+
+    def get(self, table, row_id):
+        rows = self._rows(table)
+        with self.lock:
+            return rows.get(row_key(rows, row_id))
+
+    def upsert(self, table, row):
+        with self.lock:
+            if table in self.data and row and row.get('id') is not None:
+                self.data[table][row['id']] = {**self.data[table].get(row['id'], {}), **row}
+                self._changed(table, 'upsert', self.data[table][row['id']])
+            self.pending.add(table)
+
+    def patch(self, table, row_id, **fields):
+        with self.lock:
+            rows = self.data.get(table)
+            if rows is not None:
+                row = rows.get(row_key(rows, row_id))
+                if row is not None:
+                    row.update(fields)
+                    self._changed(table, 'upsert', row)
+            self.pending.add(table)
+
+    def remove(self, table, row_id):
+        with self.lock:
+            rows = self.data.get(table)
+            if rows is not None:
+                key = row_key(rows, row_id)
+                rows.pop(key, None)
+                self._changed(table, 'remove', key)
+            self.pending.add(table)
+
+    def invalidate(self, table=None):
+        with self.lock:
+            for name in ([table] if table else list(self.data)):
+                self.data.pop(name, None)
+
+    def bump(self, table):
+        """Increment a table's stamp now, e.g. after a bulk import."""
+        with self.lock:
+            self.pending.add(table)
+        self.flush()
+
+    def flush(self, extra=()):
+        """Increment the stamps of every table changed locally (plus `extra`) in one round trip."""
+        with self.lock:
+            names = sorted(self.pending | set(extra))
+            self.pending -= set(names)
+        if not names:
+            return {}
+        try:
+            rows = self.client.rpc('bump_cache_versions', {'p_names': names}).execute().data or []
+        except Exception as e:
+            logger.debug('Version bump for %s failed: %r', ', '.join(names), e)
+            return {}
+        bumped = {row['name']: row['version'] for row in rows}
+        with self.lock:
+            for table, version in bumped.items():
+                if table not in self.tables:
+                    continue
+                if version != (self.versions.get(table) or 0) + 1:  # no stamp row yet counts as 0
+                    # Someone else bumped since our last look: our copy may be missing their change
+                    self.loaded_at[table] = 0
+                self.versions[table] = version
+        return bumped
+
+
+def row_key(rows, row_id):
+    # Route payloads carry ids as strings while Supabase rows carry ints
+    if row_id in rows:
+        return row_id
+    try:
+        return int(row_id)
+    except (TypeError, ValueError):
+        return row_id
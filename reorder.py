@@ -0,0 +1,173 @@
+"""Reorder suggestions from per-product sales velocity.
+
+Units sold per product per day live in a ring of `window_days` day columns.
+A refresh folds in only the sales newer than the last id seen and zeroes the
+columns of days that have rolled out of the window, so sales history is read
+once at start-up and never rescanned. Velocity, days of cover and suggested
+order quantities are then a few vectorized passes over the ring.
+"""
+import logging
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from bulk_io import iter_table
+
+logger = logging.getLogger(__name__)
+
+SALES_COLUMNS = ['id', 'created_at', 'product_id', 'quantity']
+ORDER_COLUMNS = ['id', 'product_id', 'supplier_id', 'unit_cost']
+SOURCE_BATCH = 200  # product ids per in.() filter
+
+
+class ReorderPlanner:
+    def __init__(self, client, reference, window_days=28, short_days=7, lead_days=7, safety_days=3, cover_days=14,
+                 refresh_seconds=300):
+        self.client = client
+        self.reference = reference
+        self.window_days = window_days
+        self.short_days = short_days
+        self.lead_days = lead_days
+        self.safety_days = safety_days
+        self.cover_days = cover_days
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.rows = {}  # product id -> row of self.units
+        self.units = np.zeros((0, window_days), dtype=np.int64)
+        self.day = None  # ordinal of the newest day in the ring
+        self.last_sale_id = None
+        self.refreshed_at = None
+
+    # -- maintenance
+    def _row(self, product_id):
+        row = self.rows.get(product_id)
+        if row is None:
+            row = self.rows[product_id] = len(self.rows)
+            if row >= len(self.units):
+                grown = np.zeros((max(64, 2 * len(self.units)), self.window_days), dtype=np.int64)
+                grown[:len(self.units)] = self.units
+                self.units = grown
+        return row
+
+    def _advance(self, today):
+        # Zero the columns of the days that fall out of the window on the way to today
+        if self.day is not None and today > self.day:
+            for day in range(self.day + 1, min(today, self.day + self.window_days) + 1):
+                self.units[:, day % self.window_days] = 0
+        if self.day is None or today > self.day:
+            self.day = today
+
+    def _fold(self, sales):
+        oldest = self.day - self.window_days + 1
+        for sale in sales:
+            day = min(date.fromisoformat(str(sale.get('created_at') or '')[:10]).toordinal(), self.day)
+            if day >= oldest and sale.get('product_id') is not None:
+                row = self._row(sale['product_id'])  # may grow self.units, so resolve it first
+                self.units[row, day % self.window_days] += sale.get('quantity') or 0
+
+    def refresh(self):
+        with self.refresh_lock:
+            today = date.today()
+            if self.last_sale_id is None:
+                since = (today - timedelta(days=self.window_days - 1)).isoformat()
+                sales = list(iter_table(self.client, 'sales', SALES_COLUMNS,
+                                        where=lambda q: q.gte('created_at', since)))
+            else:
+                sales = list(iter_table(self.client, 'sales', SALES_COLUMNS, after_id=self.last_sale_id))
+            with self.lock:
+                self._advance(today.toordinal())
+                self._fold(sales)
+                if sales:
+                    self.last_sale_id = max(self.last_sale_id or 0, max(s['id'] for s in sales))
+                self.refreshed_at = time.time()
+
+    def ensure_fresh(self):
+        if self.refreshed_at is None:
+            self.refresh()
+        elif time.time() - self.refreshed_at > self.refresh_seconds and not self.refresh_lock.locked():
+            # Serve the current figures while new sales are folded in the background
+            threading.Thread(target=self._refresh_quietly, daemon=True).start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception('Reorder velocity refresh failed')
+
+    # -- suggestions
+    def velocity(self, product_ids):
+        """Units sold per day for each product: the faster of the short and full window rates."""
+        with self.lock:
+            rows = np.array([self.rows.get(pid, -1) for pid in product_ids], dtype=np.int64)
+            if not len(self.units):
+                return np.zeros(len(rows))
+            units = np.where(rows[:, None] >= 0, self.units[rows], 0)  # -1 (never sold) reads a row, then masks it
+            recent = [(self.day - k) % self.window_days for k in range(self.short_days)] if self.day else []
+            long_rate = units.sum(axis=1) / self.window_days
+            short_rate = units[:, recent].sum(axis=1) / self.short_days
+        # Taking the higher rate reacts to a product picking up without waiting out the long window
+        return np.maximum(long_rate, short_rate)
+
+    def _on_order(self):
+        orders = iter_table(self.client, 'purchase_orders', ['id', 'product_id', 'quantity'],
+                            where=lambda q: q.eq('status', 'Pending'))
+        on_order = {}
+        for order in orders:
+            on_order[order['product_id']] = on_order.get(order['product_id'], 0) + (order.get('quantity') or 0)
+        return on_order
+
+    def _sources(self, product_ids):
+        """(supplier id, unit cost) of each product's latest purchase order that wasn't cancelled.
+
+        Read when suggesting rather than kept from earlier refreshes, because an
+        order can be cancelled long after it was placed.
+        """
+        ids, sources = sorted(set(product_ids)), {}
+        for i in range(0, len(ids), SOURCE_BATCH):
+            chunk = ids[i:i + SOURCE_BATCH]
+            orders = iter_table(self.client, 'purchase_orders', ORDER_COLUMNS,
+                                where=lambda q, chunk=chunk: q.in_('product_id', chunk).neq('status', 'Cancelled'))
+            for order in orders:  # ascending id, so the latest order wins
+                if order.get('supplier_id') is not None:
+                    sources[order['product_id']] = (order['supplier_id'], order.get('unit_cost'))
+        return sources
+
+    def suggestions(self, supplier_id=None):
+        """Products that will run out within lead time plus safety days, grouped by supplier."""
+        self.ensure_fresh()
+        products = self.reference.all('products')
+        if not products:
+            return []
+        on_order = self._on_order()
+        ids = [p['id'] for p in products]
+        rate = self.velocity(ids)
+        available = np.array([(p.get('stock') or 0) + on_order.get(p['id'], 0) for p in products], dtype=np.float64)
+        cover = np.divide(available, rate, out=np.full_like(rate, np.inf), where=rate > 0)
+        due = (rate > 0) & (cover <= self.lead_days + self.safety_days)
+        wanted = np.ceil(rate * (self.lead_days + self.safety_days + self.cover_days) - available)
+        picked = np.flatnonzero(due & (wanted > 0))
+        sources = self._sources(products[i]['id'] for i in picked) if len(picked) else {}
+        supplier_names = self.reference.map('suppliers')
+        groups = {}
+        for i in picked:
+            product = products[i]
+            source, unit_cost = sources.get(product['id'], (None, None))
+            if supplier_id is not None and source != supplier_id:
+                continue
+            group = groups.setdefault(source, {'supplier_id': source, 'supplier_name': supplier_names.get(source),
+                                               'items': [], 'total_cost': 0.0})
+            quantity = int(wanted[i])
+            group['items'].append({
+                'product_id': product['id'], 'name': product.get('name'), 'stock': product.get('stock') or 0,
+                'on_order': on_order.get(product['id'], 0), 'daily_velocity': round(float(rate[i]), 2),
+                'days_of_cover': round(float(cover[i]), 1), 'suggested_quantity': quantity, 'unit_cost': unit_cost,
+            })
+            group['total_cost'] += quantity * float(unit_cost or 0)
+        for group in groups.values():
+            group['items'].sort(key=lambda item: item['days_of_cover'])
+            group['total_cost'] = round(group['total_cost'], 2)
+        # Products never ordered before have no supplier yet; list them last
+        return sorted(groups.values(), key=lambda g: (g['supplier_id'] is None, g['supplier_name'] or ''))
@@ -0,0 +1,217 @@
+"""Sales reporting over in-memory columnar arrays.
+
+Sales are loaded once into NumPy arrays sorted by timestamp and then topped
+up incrementally with rows newer than the last id seen. Time-bucket totals for
+closed periods are cached, so a revenue report only re-aggregates the rows of
+the current day/week/month.
+"""
+import threading
+import time
+
+import numpy as np
+
+from bulk_io import iter_table
+
+GRANULARITIES = ('day', 'week', 'month')
+SALES_COLUMNS = ['id', 'created_at', 'product_id', 'quantity', 'total_price']
+
+
+def _to_datetime64(values):
+    # Supabase timestamps look like 2026-10-17T09:30:00.123+00:00; reports work in whole seconds
+    return np.array([(v or '1970-01-01')[:19].replace(' ', 'T') for v in values], dtype='datetime64[s]')
+
+
+def _now():
+    return np.datetime64('now', 's')
+
+
+def bucket_starts(ts, granularity):
+    """Vectorized start-of-bucket for each timestamp."""
+    days = ts.astype('datetime64[D]')
+    if granularity == 'day':
+        return days
+    if granularity == 'week':
+        # 1970-01-01 was a Thursday; shift so buckets start on Monday
+        return days - ((days.astype(np.int64) + 3) % 7).astype('timedelta64[D]')
+    if granularity == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f'Unknown granularity: {granularity}')
+
+
+class SalesReports:
+    def __init__(self, client, refresh_seconds=60, full_reload_seconds=6 * 3600):
+        self.client = client
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ts = np.empty(0, dtype='datetime64[s]')
+        self.product_id = np.empty(0, dtype=np.int64)
+        self.quantity = np.empty(0, dtype=np.int64)
+        self.revenue = np.empty(0, dtype=np.float64)
+        self.last_id = None
+        self.refreshed_at = 0.0
+        self.loaded_at = 0.0
+        self.closed = {}  # granularity -> (current bucket start, {closed bucket start: (revenue, quantity, lines)})
+        self.unit_costs = {}
+
+    # -- loading
+    def _fetch_new(self):
+        return list(iter_table(self.client, 'sales', SALES_COLUMNS, after_id=self.last_id))
+
+    def _load_unit_costs(self):
+        orders = list(iter_table(self.client, 'purchase_orders', ['id', 'product_id', 'quantity', 'unit_cost'],
+                                 where=lambda q: q.eq('status', 'Received')))
+        if not orders:
+            return {}
+        pid = np.array([o['product_id'] for o in orders], dtype=np.int64)
+        qty = np.array([o['quantity'] or 0 for o in orders], dtype=np.float64)
+        cost = np.array([o['unit_cost'] or 0 for o in orders], dtype=np.float64)
+        ids, inverse = np.unique(pid, return_inverse=True)
+        spent = np.bincount(inverse, weights=qty * cost)
+        bought = np.bincount(inverse, weights=qty)
+        avg = np.divide(spent, bought, out=np.zeros_like(spent), where=bought > 0)
+        return dict(zip(ids.tolist(), avg.tolist()))
+
+    def refresh(self, force=False):
+        with self.lock:
+            now = time.time()
+            if force or now - self.loaded_at > self.full_reload_seconds:
+                self._reset()
+                self.loaded_at = now
+            elif now - self.refreshed_at < self.refresh_seconds:
+                return
+            new = self._fetch_new()
+            self.unit_costs = self._load_unit_costs()
+            self.refreshed_at = now
+            if not new:
+                return
+            ts = _to_datetime64([r.get('created_at') for r in new])
+            self._drop_stale_closed(ts)
+            self.ts = np.concatenate([self.ts, ts])
+            self.product_id = np.concatenate([self.product_id, np.array([r['product_id'] or 0 for r in new], dtype=np.int64)])
+            self.quantity = np.concatenate([self.quantity, np.array([r['quantity'] or 0 for r in new], dtype=np.int64)])
+            self.revenue = np.concatenate([self.revenue, np.array([float(r['total_price'] or 0) for r in new])])
+            self.last_id = new[-1]['id']
+            order = np.argsort(self.ts, kind='stable')
+            self.ts, self.product_id, self.quantity, self.revenue = (
+                self.ts[order], self.product_id[order], self.quantity[order], self.revenue[order])
+
+    def _drop_stale_closed(self, new_ts):
+        # A backfilled row landing in an already-closed period invalidates that granularity's cache
+        for granularity, (current, _) in list(self.closed.items()):
+            if bucket_starts(new_ts, granularity).min() < current:
+                del self.closed[granularity]
+
+    def _window(self, start=None, end=None):
+        lo = 0 if start is None else np.searchsorted(self.ts, np.datetime64(start, 's'), side='left')
+        hi = len(self.ts) if end is None else np.searchsorted(self.ts, np.datetime64(end, 's'), side='left')
+        return slice(lo, hi)
+
+    # -- reports
+    def revenue_by(self, granularity='day', start=None, end=None, today=None):
+        """Revenue, units and sale lines for every bucket overlapping [start, end).
+
+        `today` is the app's local date, which decides the open bucket; it
+        defaults to the current UTC time.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f'granularity must be one of {", ".join(GRANULARITIES)}')
+        self.refresh()
+        with self.lock:
+            now = _now() if today is None else np.datetime64(today, 's')
+            current = bucket_starts(np.array([now]), granularity)[0]
+            cached = self.closed.get(granularity)
+            if cached is None:
+                closed = self._aggregate(self._window(end=current.astype('datetime64[s]')), granularity)
+            elif cached[0] != current:
+                # The period(s) since the cache was built have closed: fold them in rather than lose them
+                rolled = self._window(start=cached[0].astype('datetime64[s]'), end=current.astype('datetime64[s]'))
+                closed = {**cached[1], **self._aggregate(rolled, granularity)}
+            else:
+                closed = cached[1]
+            self.closed[granularity] = (current, closed)
+            open_buckets = self._aggregate(self._window(start=current.astype('datetime64[s]')), granularity)
+
+        lo = None if start is None else bucket_starts(np.array([np.datetime64(start, 's')]), granularity)[0]
+        hi = None if end is None else np.datetime64(end, 'D')
+        rows = []
+        for bucket, (revenue, quantity, lines) in sorted({**closed, **open_buckets}.items()):
+            if (lo is None or bucket >= lo) and (hi is None or bucket < hi):
+                rows.append({'period': str(bucket), 'revenue': round(revenue, 2), 'quantity': int(quantity),
+                             'lines': int(lines)})
+        return rows
+
+    def _aggregate(self, window, granularity):
+        ts = self.ts[window]
+        if not len(ts):
+            return {}
+        buckets, inverse = np.unique(bucket_starts(ts, granularity), return_inverse=True)
+        revenue = np.bincount(inverse, weights=self.revenue[window])
+        quantity = np.bincount(inverse, weights=self.quantity[window])
+        lines = np.bincount(inverse)
+        return {b: (r, q, n) for b, r, q, n in zip(buckets, revenue.tolist(), quantity.tolist(), lines.tolist())}
+
+    def _by_product(self, start=None, end=None):
+        self.refresh()
+        with self.lock:
+            window = self._window(start, end)
+            ids, inverse = np.unique(self.product_id[window], return_inverse=True)
+            revenue = np.bincount(inverse, weights=self.revenue[window], minlength=len(ids))
+            quantity = np.bincount(inverse, weights=self.quantity[window], minlength=len(ids))
+            return ids, revenue, quantity
+
+    def top_products(self, start=None, end=None, by='revenue', limit=10, names=None):
+        ids, revenue, quantity = self._by_product(start, end)
+        metric = revenue if by == 'revenue' else quantity
+        limit = min(limit, len(ids))
+        if not limit:
+            return []
+        top = np.argpartition(-metric, limit - 1)[:limit]
+        top = top[np.argsort(-metric[top], kind='stable')]
+        names = names or {}
+        return [{'product_id': int(ids[i]), 'name': names.get(int(ids[i]), f'#{ids[i]}'),
+                 'revenue': round(float(revenue[i]), 2), 'quantity': int(quantity[i])} for i in top]
+
+    def category_mix(self, categories, start=None, end=None):
+        """Revenue share per category; `categories` maps product id -> category."""
+        ids, revenue, quantity = self._by_product(start, end)
+        labels = np.array([categories.get(int(i)) or 'Uncategorised' for i in ids], dtype=object)
+        if not len(ids):
+            return []
+        names, inverse = np.unique(labels.astype(str), return_inverse=True)
+        cat_revenue = np.bincount(inverse, weights=revenue)
+        cat_quantity = np.bincount(inverse, weights=quantity)
+        total = cat_revenue.sum() or 1.0
+        order = np.argsort(-cat_revenue)
+        return [{'category': str(names[i]), 'revenue': round(float(cat_revenue[i]), 2),
+                 'quantity': int(cat_quantity[i]), 'share': round(float(cat_revenue[i] / total * 100), 1)}
+                for i in order]
+
+    def margin(self, start=None, end=None, names=None, limit=20):
+        """Gross margin using the quantity-weighted unit cost of received purchase orders."""
+        ids, revenue, quantity = self._by_product(start, end)
+        with self.lock:
+            costs = np.array([self.unit_costs.get(int(i), np.nan) for i in ids], dtype=np.float64)
+        known = ~np.isnan(costs)
+        cogs = np.where(known, costs, 0.0) * quantity
+        margin = np.where(known, revenue - cogs, np.nan)
+        covered_revenue = float(revenue[known].sum())
+        total_margin = float(np.nansum(margin))
+        order = np.argsort(-np.nan_to_num(margin, nan=-np.inf))[:limit]
+        names = names or {}
+        return {
+            'revenue': round(float(revenue.sum()), 2),
+            'costed_revenue': round(covered_revenue, 2),
+            'cogs': round(float(cogs.sum()), 2),
+            'margin': round(total_margin, 2),
+            'margin_pct': round(total_margin / covered_revenue * 100, 1) if covered_revenue else None,
+            'products': [{'product_id': int(ids[i]), 'name': names.get(int(ids[i]), f'#{ids[i]}'),
+                          'revenue': round(float(revenue[i]), 2),
+                          'margin': None if np.isnan(margin[i]) else round(float(margin[i]), 2),
+                          'margin_pct': None if np.isnan(margin[i]) or not revenue[i]
+                          else round(float(margin[i] / revenue[i] * 100), 1)}
+                         for i in order],
+        }
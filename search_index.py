@@ -0,0 +1,141 @@
+import bisect
+import heapq
+import re
+import threading
+from collections import defaultdict
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def _normalize(value):
+    return str(value or '').lower().strip()
+
+
+def _trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """In-memory typeahead over a few text fields of a reference table.
+
+    Every word of the indexed fields (plus each whole field, so `98765` finds
+    a phone number and `ravi@` an email) goes into a sorted token list, where
+    a prefix lookup is a bisect. Queries that match no prefix fall back to
+    trigram similarity, which catches typos and infixes. Rows are added and
+    removed one at a time as the reference cache changes; a full build only
+    happens when that cache reloads the table.
+    """
+
+    def __init__(self, fields, min_similarity=0.35):
+        self.fields = fields
+        self.min_similarity = min_similarity
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.texts = {}
+        self.tokens = []  # sorted (token, id)
+        self.trigrams = defaultdict(set)
+
+    # -- maintenance
+    def _text(self, row):
+        return ' '.join(_normalize(row.get(f)) for f in self.fields if row.get(f))
+
+    def _row_tokens(self, row):
+        tokens = set()
+        for field in self.fields:
+            value = _normalize(row.get(field))
+            if value:
+                tokens.add(value)
+                tokens.update(_WORD.findall(value))
+        return tokens
+
+    def _add(self, row):
+        row_id = row['id']
+        self.rows[row_id] = row
+        text = self._text(row)
+        self.texts[row_id] = text
+        for token in self._row_tokens(row):
+            bisect.insort(self.tokens, (token, row_id))
+        for gram in _trigrams(text):
+            self.trigrams[gram].add(row_id)
+
+    def _remove(self, row_id):
+        row = self.rows.pop(row_id, None)
+        if row is None:
+            return
+        for token in self._row_tokens(row):
+            i = bisect.bisect_left(self.tokens, (token, row_id))
+            if i < len(self.tokens) and self.tokens[i] == (token, row_id):
+                del self.tokens[i]
+        for gram in _trigrams(self.texts.pop(row_id, '')):
+            self.trigrams[gram].discard(row_id)
+
+    def load(self, rows):
+        with self.lock:
+            self.rows, self.texts, self.trigrams = {}, {}, defaultdict(set)
+            self.tokens = []
+            for row in rows:
+                self.rows[row['id']] = row
+                text = self._text(row)
+                self.texts[row['id']] = text
+                self.tokens += [(token, row['id']) for token in self._row_tokens(row)]
+                for gram in _trigrams(text):
+                    self.trigrams[gram].add(row['id'])
+            self.tokens.sort()
+
+    def upsert(self, row):
+        with self.lock:
+            current = self.rows.get(row['id'])
+            if current is not None and self._text(current) == self._text(row):
+                self.rows[row['id']] = row  # e.g. a stock change: nothing searchable moved
+                return
+            self._remove(row['id'])
+            self._add(row)
+
+    def remove(self, row_id):
+        with self.lock:
+            self._remove(row_id)
+
+    def on_reference_change(self, event, payload):
+        """Listener for ReferenceCache: keeps the index in step with the cached table."""
+        if event == 'load':
+            self.load(payload)
+        elif event == 'upsert':
+            self.upsert(payload)
+        elif event == 'remove':
+            self.remove(payload)
+
+    # -- querying
+    def _prefix_ids(self, term):
+        ids = set()
+        i = bisect.bisect_left(self.tokens, (term,))
+        while i < len(self.tokens) and self.tokens[i][0].startswith(term):
+            ids.add(self.tokens[i][1])
+            i += 1
+        return ids
+
+    def search(self, query, limit=10):
+        query = _normalize(query)
+        if not query:
+            return []
+        terms = _WORD.findall(query) or [query]
+        with self.lock:
+            # Every term must prefix some token; the whole query as one token covers emails and phones
+            matched = set.intersection(*(self._prefix_ids(t) for t in terms))
+            if terms != [query]:
+                matched |= self._prefix_ids(query)
+            # Rows that start with the query first, then the shortest (closest) names
+            results = heapq.nsmallest(limit, matched, key=lambda i: (not self.texts[i].startswith(query),
+                                                                    len(self.texts[i]), self.texts[i]))
+            if len(results) < limit and len(query) >= 3:
+                grams = _trigrams(query)
+                shared = defaultdict(int)
+                for gram in grams:
+                    for row_id in self.trigrams.get(gram, ()):
+                        if row_id not in matched:
+                            shared[row_id] += 1
+                fuzzy = [(count / len(grams), row_id) for row_id, count in shared.items()
+                         if count / len(grams) >= self.min_similarity]
+                fuzzy.sort(key=lambda s: (-s[0], self.texts[s[1]]))
+                results += [row_id for _, row_id in fuzzy[:limit - len(results)]]
+            return [dict(self.rows[i]) for i in results]
@@ -0,0 +1,62 @@
+"""Production server: the app on gunicorn with one worker process per core.
+
+    python serve.py                          # binds 0.0.0.0:$PORT (default 5000)
+    WEB_CONCURRENCY=4 WEB_THREADS=128 python serve.py
+
+Workers are threaded (gthread) because every open live-update stream (/events)
+holds a thread for as long as the page is open. The thread count is therefore
+sized for the streams, not for the ordinary requests: each worker takes up to
+EVENTS_MAX_STREAMS streams (by default three quarters of its threads) and asks
+any further page to retry later, so the rest stay free for regular requests.
+Each worker imports the app after forking so it opens its own Supabase
+connection pool. On Windows, where gunicorn does not run, the app
+is served by waitress in a single process instead.
+"""
+import multiprocessing
+import os
+
+# Well above the open pages a worker is expected to stream to; idle streams cost a thread but no CPU
+DEFAULT_THREADS = 64
+
+
+def options():
+    return {
+        'bind': os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', 5000)}"),
+        'workers': int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count())),
+        'worker_class': 'gthread',
+        'threads': int(os.getenv('WEB_THREADS', DEFAULT_THREADS)),
+        'timeout': int(os.getenv('WEB_TIMEOUT', 60)),
+        'graceful_timeout': int(os.getenv('WEB_GRACEFUL_TIMEOUT', 20)),
+        'keepalive': int(os.getenv('WEB_KEEPALIVE', 5)),
+        # Recycle workers now and then so a slow leak can't grow without bound
+        'max_requests': int(os.getenv('WEB_MAX_REQUESTS', 5000)),
+        'max_requests_jitter': int(os.getenv('WEB_MAX_REQUESTS_JITTER', 500)),
+        'accesslog': os.getenv('WEB_ACCESS_LOG', '-'),
+        'preload_app': False,
+    }
+
+
+def main():
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        from waitress import serve
+        from app import create_app
+        host, port = options()['bind'].rsplit(':', 1)
+        serve(create_app(), host=host, port=int(port), threads=int(os.getenv('WEB_THREADS', DEFAULT_THREADS)))
+        return
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options().items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import create_app
+            return create_app()
+
+    Server().run()
+
+
+if __name__ == '__main__':
+    main()
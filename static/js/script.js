@@ -141,4 +141,94 @@ document.addEventListener('DOMContentLoaded', () => {
             input.style.backgroundColor = "#fff0f0";
         }
     });
-});
\ No newline at end of file
+});
+
+/**
+ * LIVE UPDATES
+ * Listens on /events and patches stock, sales and dashboard figures in place
+ * instead of reloading the page. Pages opt in with <body data-live>.
+ */
+const LOW_STOCK_THRESHOLD = 10;
+
+function patchStock(productId, stock) {
+    const input = document.getElementById(`stock-${productId}`);
+    // Leave a value the operator is editing alone; it is compared to data-original on save
+    if (input && input.value === input.dataset.original && document.activeElement !== input) {
+        input.value = stock;
+        input.dataset.original = stock;
+    } else if (input) {
+        input.dataset.original = stock;
+    }
+    const row = document.getElementById(`row-${productId}`);
+    if (row) {
+        row.classList.toggle('low-stock-row', stock <= LOW_STOCK_THRESHOLD);
+    }
+}
+
+function patchSummary(summary) {
+    document.querySelectorAll('[data-summary]').forEach(el => {
+        const value = summary[el.dataset.summary];
+        if (value !== undefined) el.textContent = value;
+    });
+    const list = document.getElementById('lowStockList');
+    if (!list || !summary.low_stock_items) return;
+    list.innerHTML = '';
+    if (!summary.low_stock_items.length) {
+        list.innerHTML = '<div class="all-good"><i class="bi bi-check-circle-fill"></i> All items sufficiently stocked!</div>';
+        return;
+    }
+    summary.low_stock_items.forEach(item => {
+        const row = document.createElement('div');
+        row.className = 'stock-row';
+        const name = document.createElement('span');
+        name.className = 'stock-name';
+        name.textContent = item.name;
+        const pill = document.createElement('span');
+        pill.className = 'stock-pill';
+        pill.textContent = `Stock: ${item.stock}`;
+        row.append(name, pill);
+        list.appendChild(row);
+    });
+}
+
+function prependSales(sale) {
+    const tbody = document.querySelector('#salesTable tbody');
+    // Only the unfiltered list is newest-first; searched pages keep what they matched
+    if (!tbody || new URLSearchParams(location.search).has('q')) return;
+    const empty = tbody.querySelector('td[colspan]');
+    if (empty) empty.parentElement.remove();
+    sale.lines.slice().reverse().forEach(line => {
+        const row = document.createElement('tr');
+        row.className = 'table-success';
+        row.innerHTML = `
+            <td class="text-muted">new</td>
+            <td class="text-muted" style="font-size: 0.85rem">${sale.created_at.slice(0, 16)}</td>
+            <td><span class="badge-custom">${Number(line.product_id)}</span></td>
+            <td><strong>${Number(line.quantity)}</strong></td>
+            <td><strong style="color: #f97316">Rs ${Number(line.total_price)}</strong></td>
+            <td><a href="/invoice/${Number(line.id)}" class="btn btn-outline-primary btn-sm">
+                <i class="bi bi-file-earmark-text me-1"></i>View</a></td>`;
+        tbody.prepend(row);
+        setTimeout(() => row.classList.remove('table-success'), 3000);
+    });
+}
+
+function connectLiveUpdates() {
+    if (!window.EventSource || !document.body.hasAttribute('data-live')) return;
+    // EventSource reconnects by itself and resends Last-Event-ID, so nothing is missed
+    const source = new EventSource('/events');
+    source.addEventListener('stock', e => {
+        const data = JSON.parse(e.data);
+        patchStock(data.id, data.stock);
+    });
+    source.addEventListener('product_deleted', e => {
+        const row = document.getElementById(`row-${JSON.parse(e.data).id}`);
+        if (row) row.remove();
+    });
+    source.addEventListener('summary', e => patchSummary(JSON.parse(e.data)));
+    source.addEventListener('sale', e => prependSales(JSON.parse(e.data)));
+    // The server fell too far behind this page to replay what it missed
+    source.addEventListener('reset', () => location.reload());
+}
+
+document.addEventListener('DOMContentLoaded', connectLiveUpdates);
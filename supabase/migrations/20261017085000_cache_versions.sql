@@ -0,0 +1,22 @@
+-- One change counter per cached table. Workers that write a table bump its counter with
+-- bump_cache_versions; every worker compares counters every few seconds and reloads a table
+-- whose counter has moved. The increment is atomic, so two workers bumping at once get
+-- consecutive numbers and each can tell whether anyone else wrote since it last looked.
+
+create table if not exists cache_versions (
+  name text primary key,
+  version bigint not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+create or replace function bump_cache_versions(p_names text[])
+returns table (name text, version bigint)
+language sql
+as $$
+  insert into cache_versions as cv (name, version)
+  select n, 1 from unnest(p_names) as t(n)
+  order by n
+  on conflict (name) do update
+  set version = cv.version + 1, updated_at = now()
+  returning cv.name, cv.version;
+$$;
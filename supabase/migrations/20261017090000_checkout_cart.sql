@@ -0,0 +1,105 @@
+-- Multi-line checkout: every line of a cart shares an order_id on the sales table,
+-- and stock is decremented conditionally inside one transaction.
+
+alter table sales add column if not exists order_id uuid;
+alter table sales add column if not exists customer_id bigint references customers(id) on delete set null;
+alter table sales add column if not exists discount numeric not null default 0;
+alter table sales add column if not exists discount_code text;
+alter table sales add column if not exists amount_paid numeric;
+alter table sales add column if not exists payment_method text not null default 'Cash';
+
+create index if not exists sales_order_id_idx on sales (order_id);
+
+create or replace function checkout_cart(
+  p_items jsonb,
+  p_customer_id bigint default null,
+  p_discount_code text default null,
+  p_payment_method text default 'Cash',
+  p_amount_paid numeric default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+  v_order_id uuid := gen_random_uuid();
+  v_item record;
+  v_product products%rowtype;
+  v_code discounts%rowtype;
+  v_subtotal numeric := 0;
+  v_discount numeric := 0;
+  v_lines jsonb := '[]'::jsonb;
+begin
+  if p_items is null or jsonb_array_length(p_items) = 0 then
+    raise exception 'Cart is empty';
+  end if;
+
+  -- Lock rows in id order so concurrent checkouts can't deadlock; the
+  -- "stock >= quantity" guard makes overselling impossible.
+  for v_item in
+    select (value->>'product_id')::bigint as product_id, sum((value->>'quantity')::int) as quantity
+    from jsonb_array_elements(p_items)
+    group by 1
+    order by 1
+  loop
+    if v_item.quantity is null or v_item.quantity <= 0 then
+      raise exception 'Invalid quantity for product %', v_item.product_id;
+    end if;
+
+    update products set stock = stock - v_item.quantity
+    where id = v_item.product_id and stock >= v_item.quantity
+    returning * into v_product;
+
+    if not found then
+      raise exception 'Insufficient stock for product %', v_item.product_id;
+    end if;
+
+    v_subtotal := v_subtotal + v_product.price * v_item.quantity;
+    v_lines := v_lines || jsonb_build_object(
+      'product_id', v_product.id,
+      'quantity', v_item.quantity,
+      'total_price', v_product.price * v_item.quantity,
+      'stock', v_product.stock
+    );
+  end loop;
+
+  if coalesce(p_discount_code, '') <> '' then
+    select * into v_code from discounts
+    where code = upper(p_discount_code)
+      and is_active
+      and (expires_at is null or expires_at::date >= current_date);
+
+    if not found then
+      raise exception 'Invalid or expired discount code %', upper(p_discount_code);
+    end if;
+    if v_subtotal < coalesce(v_code.min_order_value, 0) then
+      raise exception 'Discount % needs a minimum order of %', v_code.code, v_code.min_order_value;
+    end if;
+
+    v_discount := case
+      when v_code.discount_type = 'percentage' then round(v_subtotal * v_code.discount_value / 100, 2)
+      else least(v_code.discount_value, v_subtotal)
+    end;
+  end if;
+
+  -- Order-level fields are repeated on each line; the invoice reads them from the first one.
+  insert into sales (order_id, product_id, quantity, total_price, customer_id,
+                     discount, discount_code, amount_paid, payment_method)
+  select v_order_id,
+         (line->>'product_id')::bigint,
+         (line->>'quantity')::int,
+         (line->>'total_price')::numeric,
+         p_customer_id,
+         v_discount,
+         nullif(upper(p_discount_code), ''),
+         p_amount_paid,
+         coalesce(p_payment_method, 'Cash')
+  from jsonb_array_elements(v_lines) as line;
+
+  return jsonb_build_object(
+    'order_id', v_order_id,
+    'subtotal', v_subtotal,
+    'discount', v_discount,
+    'sale_ids', (select jsonb_agg(id order by id) from sales where order_id = v_order_id),
+    'lines', v_lines
+  );
+end;
+$$;
@@ -0,0 +1,31 @@
+-- Apply a batch of stock edits in one statement and report a result per row.
+-- Each change is {"id": ..., "stock": n} for an absolute value or {"id": ..., "delta": n}.
+
+create or replace function bulk_adjust_stock(p_changes jsonb)
+returns jsonb
+language sql
+as $$
+  with changes as (
+    select (c->>'id')::bigint as id, (c->>'stock')::int as stock, (c->>'delta')::int as delta, ord
+    from jsonb_array_elements(p_changes) with ordinality as t(c, ord)
+  ),
+  updated as (
+    update products p
+    set stock = coalesce(ch.stock, p.stock + coalesce(ch.delta, 0))
+    from changes ch
+    where p.id = ch.id and coalesce(ch.stock, p.stock + coalesce(ch.delta, 0)) >= 0
+    returning p.id, p.stock
+  )
+  select coalesce(jsonb_agg(jsonb_build_object(
+    'id', ch.id,
+    'success', u.id is not null,
+    'stock', u.stock,
+    'error', case
+      when u.id is not null then null
+      when not exists (select 1 from products where id = ch.id) then 'Product not found'
+      else 'Stock cannot go below zero'
+    end
+  ) order by ch.ord), '[]'::jsonb)
+  from changes ch
+  left join updated u on u.id = ch.id;
+$$;
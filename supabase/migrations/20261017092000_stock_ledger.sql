@@ -0,0 +1,285 @@
+-- Append-only stock ledger. Every stock change is a movement row; products.stock is the
+-- running total kept in the same transaction so the rest of the app can keep reading it.
+-- Periodic snapshots make current and historical stock cheap to recompute from the ledger.
+
+create table if not exists stock_movements (
+  id bigserial primary key,
+  product_id bigint not null references products(id) on delete cascade,
+  delta integer not null,
+  reason text not null check (reason in ('sale', 'return', 'receipt', 'adjust', 'opening')),
+  ref_id text,
+  created_at timestamptz not null default now()
+);
+create index if not exists stock_movements_product_idx on stock_movements (product_id, id);
+create index if not exists stock_movements_created_idx on stock_movements (created_at);
+
+create table if not exists stock_snapshots (
+  product_id bigint not null references products(id) on delete cascade,
+  taken_at timestamptz not null default now(),
+  stock integer not null,
+  last_movement_id bigint not null default 0,
+  primary key (product_id, taken_at)
+);
+
+-- Record a movement and move the running total; raises if stock would go negative.
+create or replace function apply_stock_movement(p_product_id bigint, p_delta integer, p_reason text, p_ref_id text default null)
+returns integer
+language plpgsql
+as $$
+declare
+  v_stock integer;
+begin
+  update products set stock = stock + p_delta
+  where id = p_product_id and stock + p_delta >= 0
+  returning stock into v_stock;
+  if not found then
+    if exists (select 1 from products where id = p_product_id) then
+      raise exception 'Insufficient stock for product %', p_product_id;
+    end if;
+    raise exception 'Product not found: %', p_product_id;
+  end if;
+  insert into stock_movements (product_id, delta, reason, ref_id) values (p_product_id, p_delta, p_reason, p_ref_id);
+  return v_stock;
+end;
+$$;
+
+create or replace function snapshot_stock()
+returns integer
+language plpgsql
+as $$
+declare
+  v_count integer;
+begin
+  -- Block writers for the instant it takes to read a consistent (stock, last movement) pair
+  lock table stock_movements in exclusive mode;
+  insert into stock_snapshots (product_id, stock, last_movement_id)
+  select p.id, p.stock, (select coalesce(max(id), 0) from stock_movements) from products p;
+  get diagnostics v_count = row_count;
+  return v_count;
+end;
+$$;
+
+-- Stock of every product (or one) at a point in time: latest snapshot at or before it plus later deltas.
+create or replace function stock_as_of(p_at timestamptz, p_product_id bigint default null)
+returns table (product_id bigint, stock bigint)
+language sql
+stable
+as $$
+  select p.id,
+         coalesce(s.stock, 0) + coalesce((
+           select sum(m.delta) from stock_movements m
+           where m.product_id = p.id
+             and m.id > coalesce(s.last_movement_id, 0)
+             and m.created_at <= p_at
+         ), 0)
+  from products p
+  left join lateral (
+    select ss.stock, ss.last_movement_id from stock_snapshots ss
+    where ss.product_id = p.id and ss.taken_at <= p_at
+    order by ss.taken_at desc limit 1
+  ) s on true
+  where p_product_id is null or p.id = p_product_id;
+$$;
+
+-- Status transitions that move stock, each in one call. Re-sending the same status is a no-op,
+-- so a double-clicked "Received" can no longer add the quantity twice.
+create or replace function transition_purchase_order(p_order_id bigint, p_status text)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_order purchase_orders%rowtype;
+  v_stock integer;
+begin
+  select * into v_order from purchase_orders where id = p_order_id for update;
+  if not found then
+    raise exception 'Purchase order not found: %', p_order_id;
+  end if;
+  if v_order.status = 'Received' and p_status <> 'Received' then
+    raise exception 'Purchase order % was already received', p_order_id;
+  end if;
+  if v_order.status is distinct from p_status then
+    update purchase_orders set status = p_status where id = p_order_id;
+    if p_status = 'Received' then
+      v_stock := apply_stock_movement(v_order.product_id, v_order.quantity, 'receipt', 'po:' || p_order_id);
+    end if;
+  end if;
+  return jsonb_build_object('id', p_order_id, 'status', p_status, 'product_id', v_order.product_id, 'stock', v_stock);
+end;
+$$;
+
+create or replace function transition_return(p_return_id bigint, p_status text)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_return returns%rowtype;
+  v_stock integer;
+begin
+  select * into v_return from returns where id = p_return_id for update;
+  if not found then
+    raise exception 'Return not found: %', p_return_id;
+  end if;
+  if v_return.status = 'Approved' and p_status <> 'Approved' then
+    raise exception 'Return % was already approved', p_return_id;
+  end if;
+  if v_return.status is distinct from p_status then
+    update returns set status = p_status where id = p_return_id;
+    if p_status = 'Approved' then
+      v_stock := apply_stock_movement(v_return.product_id, v_return.quantity, 'return', 'return:' || p_return_id);
+    end if;
+  end if;
+  return jsonb_build_object('id', p_return_id, 'status', p_status, 'product_id', v_return.product_id, 'stock', v_stock);
+end;
+$$;
+
+-- Manual adjustments now go through the ledger as well. Rows are locked in id order, like checkout_cart,
+-- so two overlapping batches can't deadlock; results still come back in the order of p_changes.
+create or replace function bulk_adjust_stock(p_changes jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_change record;
+  v_id bigint;
+  v_current integer;
+  v_delta integer;
+  v_results jsonb := '{}'::jsonb;  -- input position -> result
+begin
+  for v_change in
+    select c, ord from jsonb_array_elements(p_changes) with ordinality as t(c, ord)
+    order by (c->>'id')::bigint, ord
+  loop
+    v_id := (v_change.c->>'id')::bigint;
+    select stock into v_current from products where id = v_id for update;
+    if not found then
+      v_results := v_results || jsonb_build_object(v_change.ord::text,
+        jsonb_build_object('id', v_id, 'success', false, 'stock', null, 'error', 'Product not found'));
+      continue;
+    end if;
+    v_delta := coalesce((v_change.c->>'stock')::int - v_current, (v_change.c->>'delta')::int, 0);
+    if v_current + v_delta < 0 then
+      v_results := v_results || jsonb_build_object(v_change.ord::text,
+        jsonb_build_object('id', v_id, 'success', false, 'stock', null, 'error', 'Stock cannot go below zero'));
+      continue;
+    end if;
+    if v_delta <> 0 then
+      v_current := apply_stock_movement(v_id, v_delta, 'adjust');
+    end if;
+    v_results := v_results || jsonb_build_object(v_change.ord::text,
+      jsonb_build_object('id', v_id, 'success', true, 'stock', v_current, 'error', null));
+  end loop;
+  return (
+    select coalesce(jsonb_agg(v_results->(ord::text) order by ord), '[]'::jsonb)
+    from generate_series(1, jsonb_array_length(p_changes)) as ord
+  );
+end;
+$$;
+
+-- Sales decrement through the ledger; same contract as before.
+create or replace function checkout_cart(
+  p_items jsonb,
+  p_customer_id bigint default null,
+  p_discount_code text default null,
+  p_payment_method text default 'Cash',
+  p_amount_paid numeric default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+  v_order_id uuid := gen_random_uuid();
+  v_item record;
+  v_price numeric;
+  v_stock integer;
+  v_code discounts%rowtype;
+  v_subtotal numeric := 0;
+  v_discount numeric := 0;
+  v_lines jsonb := '[]'::jsonb;
+begin
+  if p_items is null or jsonb_array_length(p_items) = 0 then
+    raise exception 'Cart is empty';
+  end if;
+
+  for v_item in
+    select (value->>'product_id')::bigint as product_id, sum((value->>'quantity')::int) as quantity
+    from jsonb_array_elements(p_items)
+    group by 1
+    order by 1
+  loop
+    if v_item.quantity is null or v_item.quantity <= 0 then
+      raise exception 'Invalid quantity for product %', v_item.product_id;
+    end if;
+    v_stock := apply_stock_movement(v_item.product_id, -v_item.quantity, 'sale', 'order:' || v_order_id);
+    select price into v_price from products where id = v_item.product_id;
+    v_subtotal := v_subtotal + v_price * v_item.quantity;
+    v_lines := v_lines || jsonb_build_object(
+      'product_id', v_item.product_id,
+      'quantity', v_item.quantity,
+      'total_price', v_price * v_item.quantity,
+      'stock', v_stock
+    );
+  end loop;
+
+  if coalesce(p_discount_code, '') <> '' then
+    select * into v_code from discounts
+    where code = upper(p_discount_code)
+      and is_active
+      and (expires_at is null or expires_at::date >= current_date);
+
+    if not found then
+      raise exception 'Invalid or expired discount code %', upper(p_discount_code);
+    end if;
+    if v_subtotal < coalesce(v_code.min_order_value, 0) then
+      raise exception 'Discount % needs a minimum order of %', v_code.code, v_code.min_order_value;
+    end if;
+
+    v_discount := case
+      when v_code.discount_type = 'percentage' then round(v_subtotal * v_code.discount_value / 100, 2)
+      else least(v_code.discount_value, v_subtotal)
+    end;
+  end if;
+
+  insert into sales (order_id, product_id, quantity, total_price, customer_id,
+                     discount, discount_code, amount_paid, payment_method)
+  select v_order_id,
+         (line->>'product_id')::bigint,
+         (line->>'quantity')::int,
+         (line->>'total_price')::numeric,
+         p_customer_id,
+         v_discount,
+         nullif(upper(p_discount_code), ''),
+         p_amount_paid,
+         coalesce(p_payment_method, 'Cash')
+  from jsonb_array_elements(v_lines) as line;
+
+  return jsonb_build_object(
+    'order_id', v_order_id,
+    'subtotal', v_subtotal,
+    'discount', v_discount,
+    'sale_ids', (select jsonb_agg(id order by id) from sales where order_id = v_order_id),
+    'lines', v_lines
+  );
+end;
+$$;
+
+-- New products enter the ledger with their initial stock.
+create or replace function record_opening_stock()
+returns trigger
+language plpgsql
+as $$
+begin
+  if new.stock <> 0 then
+    insert into stock_movements (product_id, delta, reason) values (new.id, new.stock, 'opening');
+  end if;
+  return new;
+end;
+$$;
+
+drop trigger if exists products_opening_stock on products;
+create trigger products_opening_stock after insert on products
+for each row execute function record_opening_stock();
+
+-- Opening balance: the stock on hand when the ledger starts.
+insert into stock_snapshots (product_id, stock, last_movement_id)
+select id, stock, 0 from products
+on conflict do nothing;
@@ -0,0 +1,77 @@
+-- Per-month, per-category totals kept up to date by triggers, so the expenses page and the
+-- profit-and-loss report read one row per month and category instead of scanning every expense.
+-- source is 'expenses' (category = expense category) or 'refunds' (approved returns, category 'Refunds').
+
+create table if not exists monthly_rollups (
+  source text not null check (source in ('expenses', 'refunds')),
+  month date not null,
+  category text not null,
+  total numeric(14, 2) not null default 0,
+  entries integer not null default 0,
+  primary key (source, month, category)
+);
+
+create or replace function bump_monthly_rollup(p_source text, p_month date, p_category text, p_amount numeric, p_entries integer)
+returns void
+language sql
+as $$
+  insert into monthly_rollups (source, month, category, total, entries)
+  values (p_source, date_trunc('month', p_month)::date, coalesce(p_category, 'General'), p_amount, p_entries)
+  on conflict (source, month, category) do update
+  set total = monthly_rollups.total + excluded.total,
+      entries = monthly_rollups.entries + excluded.entries;
+$$;
+
+create or replace function rollup_expense()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform bump_monthly_rollup('expenses', coalesce(old.expense_date, old.created_at::date), old.category,
+                                -coalesce(old.amount, 0), -1);
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform bump_monthly_rollup('expenses', coalesce(new.expense_date, new.created_at::date), new.category,
+                                coalesce(new.amount, 0), 1);
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists expenses_rollup on expenses;
+create trigger expenses_rollup after insert or update or delete on expenses
+for each row execute function rollup_expense();
+
+-- Only approved returns are refunds; a status change in or out of Approved moves the amount.
+create or replace function rollup_refund()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') and old.status = 'Approved' then
+    perform bump_monthly_rollup('refunds', old.created_at::date, 'Refunds', -coalesce(old.refund_amount, 0), -1);
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') and new.status = 'Approved' then
+    perform bump_monthly_rollup('refunds', new.created_at::date, 'Refunds', coalesce(new.refund_amount, 0), 1);
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists returns_rollup on returns;
+create trigger returns_rollup after insert or update or delete on returns
+for each row execute function rollup_refund();
+
+-- Backfill from existing history.
+delete from monthly_rollups;
+insert into monthly_rollups (source, month, category, total, entries)
+select 'expenses', date_trunc('month', coalesce(expense_date, created_at::date))::date, coalesce(category, 'General'),
+       sum(coalesce(amount, 0)), count(*)
+from expenses
+group by 2, 3;
+insert into monthly_rollups (source, month, category, total, entries)
+select 'refunds', date_trunc('month', created_at)::date, 'Refunds', sum(coalesce(refund_amount, 0)), count(*)
+from returns
+where status = 'Approved'
+group by 2;
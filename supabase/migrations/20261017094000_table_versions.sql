@@ -0,0 +1,15 @@
+-- Conditional GETs (ETag / Last-Modified) compare the cache_versions counters of the tables a page
+-- reads. The app bumps them with bump_cache_versions once a write request is done, one round trip
+-- for every table it wrote, rather than from triggers: a counter row updated inside each writing
+-- transaction stays locked until that transaction commits, so every checkout would queue behind it.
+-- Writes made outside the app (SQL console, other services) must bump the tables they touch themselves:
+--   select * from bump_cache_versions(array['products', 'sales']);
+
+drop function if exists touch_cache_version() cascade;
+drop trigger if exists cache_versions_stamp on cache_versions;
+drop function if exists stamp_cache_version();
+
+insert into cache_versions (name)
+select unnest(array['products', 'sales', 'customers', 'suppliers', 'discounts',
+                    'purchase_orders', 'returns', 'expenses'])
+on conflict (name) do nothing;
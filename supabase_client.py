@@ -0,0 +1,120 @@
+"""Supabase client construction for the app: one pooled HTTP transport, built on first use.
+
+The client is created lazily so importing the app stays fast and each server
+worker opens its own connections after it has forked. Every PostgREST, auth
+and RPC call shares one keep-alive (HTTP/2 where available) connection pool
+with explicit timeouts, and idempotent reads are retried with backoff.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRY_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class RetryTransport(httpx.HTTPTransport):
+    """Retries reads on transient failures with capped exponential backoff and jitter.
+
+    Failing to connect is retried for every method by the base transport's own
+    `retries`, because nothing reached the server. A write that was sent is
+    never replayed: checkout and stock RPCs are POSTs and must not run twice.
+    """
+
+    def __init__(self, max_retries=3, backoff=0.2, max_backoff=2.0, **kwargs):
+        super().__init__(**kwargs)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def _delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def handle_request(self, request):
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = super().handle_request(request)
+            except (httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
+                if request.method not in RETRY_METHODS or attempt >= self.max_retries:
+                    raise
+                logger.warning('Retrying %s %s after %r', request.method, request.url.path, e)
+            else:
+                if (request.method not in RETRY_METHODS or response.status_code not in RETRY_STATUSES
+                        or attempt >= self.max_retries):
+                    return response
+                header = response.headers.get('Retry-After', '')
+                retry_after = float(header) if header.isdigit() else None
+                response.close()
+                logger.warning('Retrying %s %s after HTTP %s', request.method, request.url.path, response.status_code)
+            attempt += 1
+            time.sleep(self._delay(attempt, retry_after))
+
+
+def http_client():
+    """The shared httpx client handed to supabase-py for PostgREST, auth and functions."""
+    http2 = os.getenv('SUPABASE_HTTP2', '1') == '1'
+    try:
+        import h2  # noqa: F401  (httpx only speaks HTTP/2 with the h2 package installed)
+    except ImportError:
+        http2 = False
+    transport = RetryTransport(
+        http2=http2,
+        retries=int(os.getenv('SUPABASE_CONNECT_RETRIES', 2)),
+        max_retries=int(os.getenv('SUPABASE_READ_RETRIES', 3)),
+        backoff=float(os.getenv('SUPABASE_RETRY_BACKOFF', 0.2)),
+        limits=httpx.Limits(max_connections=int(os.getenv('SUPABASE_MAX_CONNECTIONS', 32)),
+                            max_keepalive_connections=int(os.getenv('SUPABASE_MAX_KEEPALIVE', 16)),
+                            keepalive_expiry=float(os.getenv('SUPABASE_KEEPALIVE_SECONDS', 30))),
+    )
+    timeout = httpx.Timeout(float(os.getenv('SUPABASE_READ_TIMEOUT', 15)),
+                            connect=float(os.getenv('SUPABASE_CONNECT_TIMEOUT', 3)),
+                            pool=float(os.getenv('SUPABASE_POOL_TIMEOUT', 5)))
+    return httpx.Client(transport=transport, timeout=timeout, follow_redirects=True)
+
+
+def check_config():
+    """Fail at startup, not on the first request, when credentials are missing."""
+    if os.getenv('SUPABASE_BACKEND') != 'memory' and not (os.getenv('SUPABASE_URL') and os.getenv('SUPABASE_KEY')):
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
+
+
+def create_supabase():
+    # SUPABASE_BACKEND=memory swaps in the in-process stand-in used by the benchmarks
+    if os.getenv('SUPABASE_BACKEND') == 'memory':
+        from fake_supabase import FakeSupabase
+        max_rows = os.getenv('FAKE_SUPABASE_MAX_ROWS')
+        return FakeSupabase(latency=float(os.getenv('FAKE_SUPABASE_LATENCY_MS', 0)) / 1000,
+                            max_rows=int(max_rows) if max_rows else None)
+    # Imported here: supabase-py pulls in its realtime/storage stacks, which is most of the import time
+    from supabase import ClientOptions, create_client
+    return create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'),
+                         options=ClientOptions(httpx_client=http_client()))
+
+
+class LazyClient:
+    """Builds the wrapped client on first attribute access, once, from any thread."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
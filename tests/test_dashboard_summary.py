@@ -0,0 +1,22 @@
+from dashboard_summary import DashboardSummary
+
+
+def reconciled(versions):
+    summary = DashboardSummary()
+    summary.reconcile([{'id': 1, 'name': 'Tea', 'price': 2, 'stock': 5}], [], versions)
+    return summary
+
+
+def test_another_workers_write_triggers_a_reconcile():
+    summary = reconciled({'products': 4, 'sales': 9})
+    assert not summary.needs_reconcile({'products': 4, 'sales': 9})
+    assert summary.needs_reconcile({'products': 5, 'sales': 9})
+
+
+def test_own_stamped_write_keeps_the_counters():
+    summary = reconciled({'products': 4, 'sales': 9})
+    summary.writes_stamped({'products': 5})
+    assert not summary.needs_reconcile({'products': 5, 'sales': 9})
+    # Someone else's bump landed between ours: the deltas may be missing their write
+    summary.writes_stamped({'sales': 11})
+    assert summary.needs_reconcile({'products': 5, 'sales': 11})
@@ -0,0 +1,51 @@
+from events import EventBroker, RealtimeFanout
+
+
+class LoopbackFanout:
+    """Stands in for the Realtime channel: relays straight into the other brokers."""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.receive = None
+
+    def start(self, receive):
+        self.receive = receive
+        self.hub.append(self)
+
+    def send(self, event_id, event, data):
+        for peer in self.hub:
+            if peer is not self:
+                peer.receive(event_id, event, data)
+
+
+def frames(stream, n):
+    return [next(stream) for _ in range(n)]
+
+
+def test_event_published_in_one_worker_reaches_streams_in_another():
+    hub = []
+    a, b = EventBroker(fanout=LoopbackFanout(hub)), EventBroker(fanout=LoopbackFanout(hub))
+    stream = b.subscribe()
+    assert next(stream).startswith('retry:')
+    event_id = a.publish('stock', {'id': 1, 'stock': 4})
+    frame = next(stream)
+    assert frame == f'id: {event_id}\nevent: stock\ndata: {{"id":1,"stock":4}}\n\n'
+    assert (a.published, b.received) == (1, 1)
+
+    # A client reconnecting to either worker with the same Last-Event-ID gets the same backlog
+    later = a.publish('summary', {'today_sales': 9})
+    for broker in (a, b):
+        replay = broker.subscribe(event_id)
+        assert frames(replay, 2)[1].startswith(f'id: {later}\nevent: summary')
+        replay.close()
+    stream.close()
+
+
+def test_fanout_ignores_its_own_broadcasts():
+    got = []
+    fanout = RealtimeFanout('https://example.supabase.co', 'key')
+    fanout.origin = 'me'
+    fanout.receive = lambda *message: got.append(message)
+    fanout._on_broadcast({'event': 'live', 'payload': {'origin': 'me', 'id': 1, 'event': 'stock', 'data': {}}})
+    fanout._on_broadcast({'event': 'live', 'payload': {'origin': 'other', 'id': 2, 'event': 'stock', 'data': {}}})
+    assert got == [(2, 'stock', {})]
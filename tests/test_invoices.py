@@ -0,0 +1,31 @@
+import os
+
+os.environ.setdefault('SUPABASE_BACKEND', 'memory')
+
+import pytest
+
+import app as store
+
+
+@pytest.fixture
+def client():
+    store.app.config.update(LOGIN_DISABLED=True, TESTING=True)
+    return store.app.test_client()
+
+
+def test_batch_for_a_day_without_sales(client):
+    response = client.get('/invoices/batch', query_string={'date': '2020-01-01'})
+    assert response.status_code == 200
+    assert b'No invoices in this range.' in response.data
+    assert b'0 invoices' in response.data
+
+
+def test_batch_lists_each_order_once(client):
+    db = store.raw_supabase
+    db.insert_row('products', {'id': 501, 'name': 'Tea', 'price': 2, 'stock': 10})
+    for order in ('a', 'a', 'b'):
+        db.insert_row('sales', {'order_id': f'batch-{order}', 'product_id': 501, 'quantity': 1, 'total_price': 2,
+                                'created_at': '2020-01-02T10:00:00'})
+    response = client.get('/invoices/batch', query_string={'date': '2020-01-02'})
+    assert response.status_code == 200
+    assert b'2 invoices' in response.data and b'No invoices in this range.' not in response.data
@@ -0,0 +1,44 @@
+import os
+
+os.environ.setdefault('SUPABASE_BACKEND', 'memory')
+
+import pytest
+
+import app as store
+
+
+@pytest.fixture
+def client():
+    store.app.config.update(LOGIN_DISABLED=True, TESTING=True)
+    db = store.raw_supabase
+    db.tables['expenses'].clear()
+    for i in range(1, 12):
+        # Every third expense has no date: the order column is null
+        db.insert_row('expenses', {'title': f'e{i}', 'amount': i, 'category': 'General',
+                                   'expense_date': None if i % 3 == 0 else f'2026-10-{i:02d}'})
+    return store.app.test_client()
+
+
+def walk(client, name, limit=2):
+    ids, cursor = [], None
+    while True:
+        query = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+        body = client.get(f'/api/{name}/page', query_string=query).get_json()
+        assert body['success'], body
+        ids += [row['id'] for row in body['rows']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            return ids
+
+
+def test_pages_through_rows_with_a_null_order_value(client, monkeypatch):
+    assert sorted(walk(client, 'expenses')) == sorted(store.raw_supabase.tables['expenses'])
+    monkeypatch.setitem(store.LIST_VIEWS['expenses'], 'order', ('expense_date', False))
+    assert sorted(walk(client, 'expenses')) == sorted(store.raw_supabase.tables['expenses'])
+
+
+@pytest.mark.parametrize('cursor', ['2026-10-01|1),id.gt.0', '2026-10-01|', 'abc'])
+def test_malformed_cursor_is_a_bad_request(client, cursor):
+    response = client.get('/api/expenses/page', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert client.get('/expenses', query_string={'cursor': cursor}).status_code == 400
@@ -0,0 +1,45 @@
+from fake_supabase import FakeSupabase
+from reference_cache import ReferenceCache
+
+
+def worker(db):
+    return ReferenceCache(db, {'suppliers': 'id, name'}, version_check_seconds=3600)
+
+
+def test_bump_behind_another_worker_reloads():
+    db = FakeSupabase()
+    db.tables['suppliers'][1] = {'id': 1, 'name': 'Acme'}
+    a, b = worker(db), worker(db)
+    assert a.get('suppliers', 1)['name'] == b.get('suppliers', 1)['name'] == 'Acme'
+
+    # a writes and bumps first; b writes its own row and bumps straight after
+    db.tables['suppliers'][1]['name'] = 'Acme Ltd'
+    a.patch('suppliers', 1, name='Acme Ltd')
+    a.flush()
+    db.tables['suppliers'][2] = {'id': 2, 'name': 'Bolt'}
+    b.upsert('suppliers', {'id': 2, 'name': 'Bolt'})
+    b.flush()
+
+    # b's increment skipped a's, so b reloads instead of keeping its stale copy
+    assert b.get('suppliers', 1)['name'] == 'Acme Ltd'
+    assert a.versions['suppliers'] + 1 == b.versions['suppliers']
+
+
+def test_own_bump_keeps_the_cached_copy():
+    db = FakeSupabase()
+    db.tables['suppliers'][1] = {'id': 1, 'name': 'Acme'}
+    a = worker(db)
+    a.get('suppliers', 1)
+    a.upsert('suppliers', {'id': 2, 'name': 'Bolt'})
+    assert a.flush() == {'suppliers': 1}
+    db.tables['suppliers'].clear()  # a reload would now come back empty
+    assert a.get('suppliers', 2)['name'] == 'Bolt'
+
+
+def test_load_pages_past_the_max_rows_cap():
+    db = FakeSupabase(max_rows=1000)
+    for i in range(1, 1501):
+        db.tables['suppliers'][i] = {'id': i, 'name': f'Supplier {i}'}
+    cache = worker(db)
+    assert len(cache.all('suppliers')) == 1500
+    assert cache.get('suppliers', 1500)['name'] == 'Supplier 1500'
@@ -0,0 +1,34 @@
+from datetime import date
+
+from fake_supabase import FakeSupabase
+from reference_cache import ReferenceCache
+from reorder import ReorderPlanner
+
+
+def test_cancelled_order_stops_being_the_source():
+    db = FakeSupabase()
+    db.insert_row('suppliers', {'id': 1, 'name': 'Acme'})
+    db.insert_row('suppliers', {'id': 2, 'name': 'Bolt'})
+    db.insert_row('products', {'id': 1, 'name': 'Tea', 'price': 2, 'stock': 1})
+    db.insert_row('sales', {'product_id': 1, 'quantity': 30, 'created_at': f'{date.today()}T09:00:00'})
+    db.insert_row('purchase_orders', {'product_id': 1, 'supplier_id': 1, 'quantity': 5, 'unit_cost': 1.0,
+                                      'status': 'Received'})
+    late = db.insert_row('purchase_orders', {'product_id': 1, 'supplier_id': 2, 'quantity': 5, 'unit_cost': 1.5,
+                                             'status': 'Received'})
+    reference = ReferenceCache(db, {'products': 'id, name, stock', 'suppliers': 'id, name'})
+    planner = ReorderPlanner(db, reference)
+    assert [g['supplier_id'] for g in planner.suggestions()] == [2]
+
+    # Cancelled after the planner has already seen it
+    db.tables['purchase_orders'][late['id']]['status'] = 'Cancelled'
+    [group] = planner.suggestions()
+    assert group['supplier_id'] == 1 and group['items'][0]['unit_cost'] == 1.0
+
+
+def test_on_order_counts_every_pending_line():
+    db = FakeSupabase(max_rows=1000)
+    for _ in range(1200):
+        db.insert_row('purchase_orders', {'product_id': 1, 'supplier_id': 1, 'quantity': 1, 'unit_cost': 1.0,
+                                          'status': 'Pending'})
+    planner = ReorderPlanner(db, ReferenceCache(db, {'products': 'id, name, stock'}))
+    assert planner._on_order() == {1: 1200}
@@ -0,0 +1,53 @@
+import numpy as np
+
+import reports
+from fake_supabase import FakeSupabase
+
+
+def sale(db, created_at, total):
+    db.insert_row('sales', {'product_id': 1, 'quantity': 1, 'total_price': total, 'created_at': created_at})
+
+
+def test_revenue_by_keeps_the_period_that_closes_on_rollover(monkeypatch):
+    db = FakeSupabase()
+    for day, total in (('2026-10-15', 10.0), ('2026-10-16', 20.0), ('2026-10-17', 30.0)):
+        sale(db, f'{day}T09:00:00', total)
+    engine = reports.SalesReports(db, refresh_seconds=0)
+
+    monkeypatch.setattr(reports, '_now', lambda: np.datetime64('2026-10-16T12:00:00', 's'))
+    assert [r['period'] for r in engine.revenue_by('day')] == ['2026-10-15', '2026-10-16', '2026-10-17']
+
+    monkeypatch.setattr(reports, '_now', lambda: np.datetime64('2026-10-17T12:00:00', 's'))
+    rows = engine.revenue_by('day')
+    assert [(r['period'], r['revenue']) for r in rows] == [
+        ('2026-10-15', 10.0), ('2026-10-16', 20.0), ('2026-10-17', 30.0)]
+
+
+def test_revenue_by_month_rollover_matches_a_fresh_engine(monkeypatch):
+    db = FakeSupabase()
+    for day, total in (('2026-09-30', 5.0), ('2026-10-01', 7.0), ('2026-10-31', 11.0), ('2026-11-01', 13.0)):
+        sale(db, f'{day}T23:00:00', total)
+    engine = reports.SalesReports(db, refresh_seconds=0)
+    monkeypatch.setattr(reports, '_now', lambda: np.datetime64('2026-10-20T00:00:00', 's'))
+    engine.revenue_by('month')
+
+    monkeypatch.setattr(reports, '_now', lambda: np.datetime64('2026-11-02T00:00:00', 's'))
+    assert engine.revenue_by('month') == reports.SalesReports(db, refresh_seconds=0).revenue_by('month')
+
+
+def test_unit_costs_page_past_the_max_rows_cap():
+    db = FakeSupabase(max_rows=1000)
+    for product_id in range(1, 1201):
+        db.insert_row('purchase_orders', {'product_id': product_id, 'quantity': 2, 'unit_cost': 3.0,
+                                          'status': 'Received'})
+    assert len(reports.SalesReports(db)._load_unit_costs()) == 1200
+
+
+def test_open_bucket_follows_the_local_date_passed_in():
+    db = FakeSupabase()
+    sale(db, '2026-10-16T09:00:00', 10.0)
+    sale(db, '2026-10-17T09:00:00', 5.0)
+    engine = reports.SalesReports(db, refresh_seconds=0)
+    rows = engine.revenue_by('day', today=np.datetime64('2026-10-17', 'D').astype(object))
+    assert engine.closed['day'][0] == np.datetime64('2026-10-17')
+    assert [(r['period'], r['revenue']) for r in rows] == [('2026-10-16', 10.0), ('2026-10-17', 5.0)]
@@ -0,0 +1,38 @@
+import os
+
+os.environ.setdefault('SUPABASE_BACKEND', 'memory')
+
+import pytest
+
+import app as store
+from analytics import QueryError
+
+
+@pytest.fixture
+def client():
+    store.app.config.update(LOGIN_DISABLED=True, TESTING=True)
+    return store.app.test_client()
+
+
+def test_export_that_fails_midway_ends_with_an_error_row(client, monkeypatch):
+    def iter_rows(sql):
+        for i in range(3):
+            yield ['id', 'name'], (i, f'row {i}')
+        raise QueryError('Query exceeded the time limit')
+
+    monkeypatch.setattr(store.analytics, 'iter_rows', iter_rows)
+    response = client.post('/sql-editor/export.csv', data={'sql': 'select 1'})
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[:4] == ['id,name', '0,row 0', '1,row 1', '2,row 2']
+    assert lines[-1].startswith('ERROR,')
+    assert 'Query exceeded the time limit' in lines[-1]
+
+
+def test_export_that_fails_before_any_row_is_a_400(client, monkeypatch):
+    def iter_rows(sql):
+        raise QueryError('no such table: nope')
+        yield
+
+    monkeypatch.setattr(store.analytics, 'iter_rows', iter_rows)
+    response = client.post('/sql-editor/export.csv', data={'sql': 'select * from nope'})
+    assert response.status_code == 400
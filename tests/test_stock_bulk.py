@@ -0,0 +1,25 @@
+import os
+
+os.environ.setdefault('SUPABASE_BACKEND', 'memory')
+
+import pytest
+
+import app as store
+
+
+@pytest.fixture
+def client():
+    store.app.config.update(LOGIN_DISABLED=True, TESTING=True)
+    return store.app.test_client()
+
+
+def test_results_follow_submission_order(client):
+    db = store.raw_supabase
+    db.insert_row('products', {'id': 701, 'name': 'Pen', 'price': 1, 'stock': 5})
+    db.insert_row('products', {'id': 702, 'name': 'Ink', 'price': 3, 'stock': 5})
+    changes = [{'id': 702, 'stock': 9}, {'id': 'x'}, {'id': 701, 'delta': 2}, {'id': 702, 'delta': 1}]
+    response = client.post('/update-stock/bulk', json={'changes': changes})
+    results = response.get_json()['results']
+    assert [r['id'] for r in results] == [702, 'x', 701]
+    assert [r['success'] for r in results] == [True, False, True]
+    assert results[0]['stock'] == 10 and results[2]['stock'] == 7